@@ -0,0 +1,352 @@
+"""Prometheus metrics shared across worker processes.
+
+Every thread of every process writes to its own small memory-mapped file
+in ``METRICS_DIR``: a list of ``(series, float)`` slots. A writer is the
+only one touching its file, so updates need no locks, and the metrics
+endpoint sums the files of all workers when scraped. Counters stay
+monotonic when a worker exits because its file is kept; clear the
+directory when the whole deployment restarts.
+
+Histogram buckets are stored non-cumulatively (one slot per bucket) and
+accumulated when rendered, so an observation touches three slots.
+
+Every scrape first folds the files of exited workers into one archive
+file, so a scrape reads one file per live writer plus the archive.
+
+The endpoint is for staff, a scraper presenting ``METRICS_TOKEN`` or an
+address in ``METRICS_ALLOWED_IPS``, and anyone while ``DEBUG`` is on.
+"""
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+INITIAL_SIZE = 64 * 1024
+# Totals of exited workers; named so collect() reads it like any other file
+ARCHIVE_FILE = 'archive.metrics'
+MERGE_LOCK_FILE = 'merge.lock'
+# The header holds the number of bytes in use
+_HEADER = struct.Struct('<Q')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'metrics')))
+
+
+class MetricsFile:
+    """Slots of one writer; see ``read_file`` for the layout."""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+        self._file = open(path, 'a+b')
+        if os.path.getsize(path) < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+        self._map()
+        for key, _, position in _entries(self._mmap):
+            self.positions[key] = position
+
+    def _map(self):
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self.used = _HEADER.unpack_from(self._mmap, 0)[0] or _HEADER.size
+
+    def _allocate(self, key):
+        encoded = key.encode()
+        padding = -(self.used + _KEY_LENGTH.size + len(encoded)) % 8
+        size = _KEY_LENGTH.size + len(encoded) + padding + _VALUE.size
+        if self.used + size > len(self._mmap):
+            capacity = len(self._mmap)
+            while self.used + size > capacity:
+                capacity *= 2
+            self._mmap.close()
+            self._file.truncate(capacity)
+            self._map()
+        _KEY_LENGTH.pack_into(self._mmap, self.used, len(encoded))
+        self._mmap[self.used + _KEY_LENGTH.size:self.used + _KEY_LENGTH.size + len(encoded)] = encoded
+        position = self.used + size - _VALUE.size
+        _VALUE.pack_into(self._mmap, position, 0.0)
+        # Publish the slot last, so readers never see a half-written one
+        self.used += size
+        _HEADER.pack_into(self._mmap, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def increment(self, key, amount=1.0):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._allocate(key)
+        _VALUE.pack_into(self._mmap, position, _VALUE.unpack_from(self._mmap, position)[0] + amount)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def _entries(buffer):
+    """Yield ``(series, value, value position)`` from a metrics file's bytes."""
+    # A scrape can race a writer growing its file; read what is complete
+    used = min(_HEADER.unpack_from(buffer, 0)[0], len(buffer))
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        start = position + _KEY_LENGTH.size
+        value_position = start + length + (-(start + length) % 8)
+        if value_position + _VALUE.size > used:
+            break
+        key = bytes(buffer[start:start + length]).decode()
+        yield key, _VALUE.unpack_from(buffer, value_position)[0], value_position
+        position = value_position + _VALUE.size
+
+
+def read_file(path):
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if len(data) < _HEADER.size:
+        return {}
+    return {key: value for key, value, _ in _entries(data)}
+
+
+_local = threading.local()
+
+
+def _writer():
+    writer = getattr(_local, 'writer', None)
+    directory = metrics_dir()
+    # A forked worker inherits the parent's thread-local; give it its own file
+    if writer is None or _local.pid != os.getpid() or _local.directory != directory:
+        os.makedirs(directory, exist_ok=True)
+        name = f'{os.getpid()}-{threading.get_ident()}.metrics'
+        writer = _local.writer = MetricsFile(os.path.join(directory, name))
+        _local.pid, _local.directory = os.getpid(), directory
+    return writer
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+REGISTRY = {}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY[name] = self
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        _writer().increment(_series(self.name, labels), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        writer = _writer()
+        bound = next(bound for bound in self.buckets if value <= bound)
+        # The bound follows a space, which cannot appear in a series outside label values
+        writer.increment(f"{_series(f'{self.name}_bucket', labels)} {_format_bound(bound)}")
+        writer.increment(_series(f'{self.name}_sum', labels), value)
+        writer.increment(_series(f'{self.name}_count', labels))
+
+
+REQUESTS = Counter('citymate_requests_total', 'Responses by view, method and status code.')
+REQUEST_LATENCY = Histogram(
+    'citymate_request_duration_seconds', 'Time to produce a response, by view.', LATENCY_BUCKETS,
+)
+REQUEST_SIZE = Histogram('citymate_request_size_bytes', 'Request body sizes, by view.', SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'citymate_response_size_bytes', 'Response body sizes, by view; streamed responses are not counted.',
+    SIZE_BUCKETS,
+)
+DB_QUERIES = Histogram('citymate_db_queries_per_request', 'Database queries per request, by view.', QUERY_BUCKETS)
+CACHE_LOOKUPS = Counter('citymate_cache_lookups_total', 'Cache reads by cache and result (hit or miss).')
+OTP_SENT = Counter('citymate_otp_sent_total', 'OTP deliveries by channel and outcome.')
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def collect():
+    """Sum every worker's file; returns ``{series: value}``."""
+    directory = metrics_dir()
+    totals = {}
+    if not os.path.isdir(directory):
+        return totals
+    for name in os.listdir(directory):
+        if not name.endswith('.metrics'):
+            continue
+        for key, value in read_file(os.path.join(directory, name)).items():
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _writer_pid(name):
+    try:
+        return int(name.partition('-')[0])
+    except ValueError:
+        return None
+
+
+def _exited(pid):
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def merge_exited_workers():
+    """Add the files of workers that have exited into the archive and delete them.
+
+    Returns how many files were merged. A lock keeps concurrent scrapes
+    from merging the same file twice.
+    """
+    directory = metrics_dir()
+    if not os.path.isdir(directory):
+        return 0
+    with open(os.path.join(directory, MERGE_LOCK_FILE), 'a+b') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = [
+            name for name in os.listdir(directory)
+            if name.endswith('.metrics') and (pid := _writer_pid(name)) is not None and _exited(pid)
+        ]
+        if not exited:
+            return 0
+        archive = MetricsFile(os.path.join(directory, ARCHIVE_FILE))
+        try:
+            for name in exited:
+                path = os.path.join(directory, name)
+                for key, value in read_file(path).items():
+                    archive.increment(key, value)
+                os.remove(path)
+        finally:
+            archive.close()
+    return len(exited)
+
+
+def _with_bound(series, bound):
+    le = f'le="{bound}"'
+    return f'{series[:-1]},{le}}}' if series.endswith('}') else f'{series}{{{le}}}'
+
+
+def render(totals):
+    """Prometheus text exposition of ``totals``."""
+    lines = []
+    by_name = {}
+    for key in totals:
+        by_name.setdefault(key.partition('{')[0].partition(' ')[0], []).append(key)
+
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        if metric.kind == 'counter':
+            lines.extend(f'{key} {totals[key]!r}' for key in sorted(by_name.get(name, [])))
+            continue
+
+        buckets = {}
+        for key in by_name.get(f'{name}_bucket', []):
+            series, _, bound = key.rpartition(' ')
+            buckets.setdefault(series, {})[bound] = totals[key]
+        for series, counts in sorted(buckets.items()):
+            running = 0.0
+            for bound in map(_format_bound, metric.buckets):
+                running += counts.get(bound, 0.0)
+                lines.append(f'{_with_bound(series, bound)} {running!r}')
+        for suffix in ('_sum', '_count'):
+            lines.extend(f'{key} {totals[key]!r}' for key in sorted(by_name.get(name + suffix, [])))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Times every request and counts its database queries, labelled by view name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        # View names rather than paths keep the number of series bounded
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'unmatched'
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_LATENCY.observe(elapsed, view=view)
+        try:
+            REQUEST_SIZE.observe(int(request.META.get('CONTENT_LENGTH') or 0), view=view)
+        except ValueError:
+            pass
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view=view)
+        DB_QUERIES.observe(queries[0], view=view)
+        return response
+
+
+def scrape_allowed(request):
+    if settings.DEBUG:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def metrics_view(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden('Forbidden.', content_type='text/plain')
+    merge_exited_workers()
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
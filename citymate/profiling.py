@@ -0,0 +1,152 @@
+"""Opt-in SQL profiling of requests.
+
+A sampled fraction of requests runs with a database execute wrapper that
+times every statement. Each profile records the query count, total
+database time, the slowest statements and repeated query fingerprints:
+the same statement shape run many times in one request is usually an
+N+1 loop over a relation. Slow requests and slow queries are logged to
+the ``citymate.sql`` logger, and the latest profiles of this process are
+kept for the staff-only debug endpoint.
+
+Unsampled requests cost one random number, so the middleware can stay
+installed in production with a small ``SQL_PROFILING_SAMPLE_RATE``.
+Staff can profile a single request with ``?profile_sql=1``.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+logger = logging.getLogger('citymate.sql')
+
+# Statements kept per profile, slowest first
+TOP_STATEMENTS = 10
+
+_recent = deque(maxlen=100)
+_recent_lock = threading.Lock()
+
+_IN_LIST = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def profiling_settings():
+    return {
+        'sample_rate': getattr(settings, 'SQL_PROFILING_SAMPLE_RATE', 0.0),
+        'slow_request_ms': getattr(settings, 'SQL_PROFILING_SLOW_REQUEST_MS', 500),
+        'slow_query_ms': getattr(settings, 'SQL_PROFILING_SLOW_QUERY_MS', 100),
+        'duplicate_threshold': getattr(settings, 'SQL_PROFILING_DUPLICATE_THRESHOLD', 5),
+    }
+
+
+def fingerprint(sql):
+    """The statement with literals and IN list lengths erased."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """Execute wrapper that times every statement on the wrapped connections."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            alias = context['connection'].alias
+            self.statements.append((sql, (time.perf_counter() - start) * 1000, alias))
+
+    def profile(self, request, response, elapsed_ms, duplicate_threshold):
+        resolver_match = getattr(request, 'resolver_match', None)
+        counts = Counter(fingerprint(sql) for sql, _, _ in self.statements)
+        slowest = sorted(self.statements, key=lambda statement: -statement[1])[:TOP_STATEMENTS]
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'duration_ms': round(elapsed_ms, 2),
+            'queries': len(self.statements),
+            'db_ms': round(sum(duration for _, duration, _ in self.statements), 2),
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in counts.most_common() if count >= duplicate_threshold
+            ],
+            'statements': [
+                {'sql': sql, 'ms': round(duration, 3), 'database': alias} for sql, duration, alias in slowest
+            ],
+        }
+
+
+def recent_profiles():
+    with _recent_lock:
+        return list(_recent)
+
+
+def _log(profile, options):
+    view = profile['view'] or profile['path']
+    if profile['duration_ms'] >= options['slow_request_ms']:
+        logger.warning(
+            'Slow request %s %s (%s): %.0fms, %d queries, %.0fms in the database',
+            profile['method'], profile['path'], view, profile['duration_ms'], profile['queries'], profile['db_ms'],
+        )
+    for statement in profile['statements']:
+        if statement['ms'] >= options['slow_query_ms']:
+            logger.warning('Slow query in %s: %.0fms %s', view, statement['ms'], statement['sql'])
+    for duplicate in profile['duplicates']:
+        logger.warning('Repeated query in %s (%d times): %s', view, duplicate['count'], duplicate['sql'])
+
+
+class SQLProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        user = getattr(request, 'user', None)
+        if request.GET.get('profile_sql') and user is not None and user.is_staff:
+            return True
+        rate = profiling_settings()['sample_rate']
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        options = profiling_settings()
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        profile = recorder.profile(request, response, (time.perf_counter() - start) * 1000,
+                                   options['duplicate_threshold'])
+        with _recent_lock:
+            _recent.append(profile)
+        _log(profile, options)
+        return response
+
+
+def sql_profiles_view(request):
+    """JSON list of this process's latest request profiles, newest first. Staff only."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return JsonResponse({'error': 'Staff only.'}, status=403)
+    profiles = recent_profiles()[::-1]
+    view = request.GET.get('view')
+    if view:
+        profiles = [profile for profile in profiles if profile['view'] == view]
+    return JsonResponse({'profiles': profiles})
@@ -33,20 +33,33 @@ INSTALLED_APPS = [
     'reviews',
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Favourite sets, rebuild locks and the catalogue version must be seen by
+# every worker process: deployments with more than one set CITYMATE_REDIS_URL.
+# The in-process cache only suits a single-process development server.
+if os.environ.get('CITYMATE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CITYMATE_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'citymate.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'citymate.profiling.SQLProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  
@@ -65,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'places.context_processors.favorites',
             ],
         },
     },
@@ -168,5 +182,57 @@ TWILIO_PHONE_NUMBER = 'twilio-phone-number-placeholder'
 
 RATELIMIT_ENABLE = True
 
+# Fallback point (Coimbatore town hall) for nearby places when the user's location is unknown
+CITYMATE_DEFAULT_LOCATION = (11.0168, 76.9558)
+
+# Half-life of a review's weight in the trending score
+TRENDING_HALF_LIFE_DAYS = 7
+
+# Bayesian prior for weighted place ratings: every place starts with this
+# many imaginary reviews of this many stars
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_COUNT = 5
+
+# SQL profiling: the share of requests profiled (staff can force one with
+# ?profile_sql=1), and what gets logged to sql_profile.log
+SQL_PROFILING_SAMPLE_RATE = 0.0
+SQL_PROFILING_SLOW_REQUEST_MS = 500
+SQL_PROFILING_SLOW_QUERY_MS = 100
+SQL_PROFILING_DUPLICATE_THRESHOLD = 5
+
+# Per-worker metric files, summed by /metrics; clear on deploy
+METRICS_DIR = os.environ.get('CITYMATE_METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+# Besides staff, /metrics answers requests with "Authorization: Bearer <token>"
+# or from these addresses. They are matched against REMOTE_ADDR, which behind
+# a load balancer is the balancer itself, so prefer the token there.
+METRICS_TOKEN = os.environ.get('CITYMATE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    address.strip() for address in os.environ.get('CITYMATE_METRICS_ALLOWED_IPS', '').split(',') if address.strip()
+]
+
+# Points METRICS_DIR at a temporary directory while tests run
+TEST_RUNNER = 'citymate.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {'format': '%(asctime)s %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'sql_profile': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'sql_profile.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+            'formatter': 'timestamped',
+        },
+    },
+    'loggers': {
+        'citymate.sql': {'handlers': ['sql_profile'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
@@ -0,0 +1,19 @@
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Keeps the metric files requests write out of the source tree."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metrics_dir = tempfile.TemporaryDirectory(prefix='citymate-metrics-')
+        self._metrics_settings = override_settings(METRICS_DIR=self._metrics_dir.name)
+        self._metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._metrics_settings.disable()
+        self._metrics_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 from users.views import WelcomeView
+from .metrics import metrics_view
+from .profiling import sql_profiles_view
 from django.conf import settings               
 from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
@@ -13,6 +15,9 @@ urlpatterns = [
     path('places/', include(('places.urls', 'places'), namespace='places')),
     
     path('accounts/', include('allauth.urls')),
+
+    path('debug/sql/', sql_profiles_view, name='sql_profiles'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
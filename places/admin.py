@@ -1,5 +1,15 @@
 from django.contrib import admin
+from django.db.models import F
+from django.utils import timezone
 from .models import Place
+from .cache import bump_catalogue_version
+from .sampling import invalidate_sample_pools
+
+def touched():
+    # update() skips save(): move the timestamp incremental exports read,
+    # and the version that keys cached detail pages
+    return {'updated_at': timezone.now(), 'version': F('version') + 1}
+
 
 class PlaceAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'sub_type', 'price_level', 'is_approved', 'average_rating', 'added_by')
@@ -8,11 +18,15 @@ class PlaceAdmin(admin.ModelAdmin):
     actions = ['approve_places', 'mark_reported']
 
     def approve_places(self, request, queryset):
-        queryset.update(is_approved=True)
+        queryset.update(is_approved=True, **touched())
+        # update() also skips the post_save receivers that keep caches in sync
+        invalidate_sample_pools()
+        bump_catalogue_version()
     approve_places.short_description = "Approve selected places"
 
     def mark_reported(self, request, queryset):
-        queryset.update(reported=True)
+        queryset.update(reported=True, **touched())
+        bump_catalogue_version()
     mark_reported.short_description = "Mark selected as reported"
 
 admin.site.register(Place, PlaceAdmin)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""REST API for approved places, plus the staff catalogue export.
+
+Place responses do a fixed number of queries however many places they
+hold: ``added_by`` is joined in, and favourites are marked from the
+user's cached favourite id set.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .export import EXPORTS, FORMATS, parse_since, stream_export
+from .favorites import get_favorite_ids
+from .geo import nearest_places
+from .models import Place
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_page_size
+from .search import search_places
+from .serializers import PlaceSerializer, requested_fields
+
+
+class PlaceCursorPagination(CursorPagination):
+    ordering = ('-weighted_rating', '-id')
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # Full-text results keep their relevance order
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', 'id')
+        return self.ordering
+
+
+class PlaceViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = PlaceSerializer
+    pagination_class = PlaceCursorPagination
+    filterset_fields = ['type', 'sub_type', 'price_level', 'area']
+    favorite_ids = None
+
+    def get_queryset(self):
+        return Place.objects.filter(is_approved=True).select_related('added_by')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['favorite_ids'] = self.favorite_ids
+        return context
+
+    def serialize(self, places, many=True):
+        fields = requested_fields(self.request)
+        if fields is None or 'is_favorited' in fields:
+            self.favorite_ids = get_favorite_ids(self.request.user)
+        return self.get_serializer(places, many=many).data
+
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.serialize(page))
+
+    def list(self, request, *args, **kwargs):
+        return self.paginated_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize(self.get_object(), many=False))
+
+    @action(detail=False)
+    def nearby(self, request):
+        """The ``limit`` places closest to ``?lat=&lon=``, nearest first."""
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+        except (KeyError, ValueError):
+            raise ValidationError({'detail': 'lat and lon are required numbers.'})
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValidationError({'detail': 'lat or lon is out of range.'})
+
+        k = get_page_size(request.query_params.get('limit'), default=10)
+        places = nearest_places(lat, lon, k, queryset=self.filter_queryset(self.get_queryset()))
+        return Response({'results': self.serialize(places)})
+
+    @action(detail=False)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        return self.paginated_response(search_places(self.filter_queryset(self.get_queryset()), query))
+
+
+class ExportView(APIView):
+    """Staff-only streaming export, e.g. ``/places/export/reviews.csv?since=2025-01-01``."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise NotFound()
+        try:
+            since = parse_since(request.query_params.get('since'))
+        except ValueError as exc:
+            raise ValidationError({'since': str(exc)})
+
+        response = StreamingHttpResponse(stream_export(kind, fmt, since), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        return response
@@ -0,0 +1,42 @@
+"""Registry of city areas shared by place filters and user preferences."""
+from .geo import haversine_km
+
+# key: (label, centroid latitude, centroid longitude)
+AREAS = {
+    'rs_puram': ('RS Puram', 11.0085, 76.9530),
+    'gandhipuram': ('Gandhipuram', 11.0176, 76.9674),
+    'peelamedu': ('Peelamedu', 11.0320, 77.0120),
+    'hopes': ('Hope College', 11.0255, 77.0200),
+    'saibaba_colony': ('Saibaba Colony', 11.0250, 76.9450),
+    'singanallur': ('Singanallur', 11.0006, 77.0280),
+    'ram_nagar': ('Ram Nagar', 11.0120, 76.9620),
+}
+OTHER_AREA = 'other'
+
+AREA_CHOICES = [(key, label) for key, (label, _, _) in AREAS.items()] + [(OTHER_AREA, 'Other/Not Listed')]
+
+# Places further than this from every centroid are assigned to OTHER_AREA
+MAX_AREA_DISTANCE_KM = 3.0
+
+
+def area_label(key):
+    return dict(AREA_CHOICES).get(key, key)
+
+
+def area_centroid(key):
+    if key not in AREAS:
+        return None
+    _, lat, lon = AREAS[key]
+    return lat, lon
+
+
+def assign_area(lat, lon):
+    """Return the key of the area whose centroid is nearest to the point."""
+    if lat is None or lon is None:
+        return OTHER_AREA
+    best, best_km = OTHER_AREA, MAX_AREA_DISTANCE_KM
+    for key, (_, area_lat, area_lon) in AREAS.items():
+        km = haversine_km(lat, lon, area_lat, area_lon)
+        if km <= best_km:
+            best, best_km = key, km
+    return best
@@ -0,0 +1,238 @@
+"""Wall-time and query-count benchmarks for the main views.
+
+Each scenario drives a view through the test client (so middleware,
+sessions and templates are included) or exercises a hot model path
+directly. Every scenario runs once against an empty cache, to count the
+queries a cold request makes, then repeatedly for timing. Results are
+checked against the scenario's query budget and, optionally, against a
+stored baseline of the same dataset.
+
+Read-only runs, for databases whose data must not change, skip scenarios
+that write, use a private in-memory cache and keep sessions in signed
+cookies, so neither the shared cache nor any table is touched.
+"""
+import json
+import time
+from importlib import import_module
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+DEFAULT_RUNS = 20
+DEFAULT_WARMUP = 2
+# A scenario regresses when its median is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and slower by at least this many milliseconds, so sub-millisecond noise is ignored
+MIN_REGRESSION_MS = 2.0
+# Settings for read-only runs; measure() clears the cache before every scenario
+READ_ONLY_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Scenario:
+    def __init__(self, name, run, query_budget, writes=False):
+        self.name = name
+        self.run = run
+        # Most queries one cold run may make, whatever the dataset size
+        self.query_budget = query_budget
+        # Writes are only benchmarked against generated data
+        self.writes = writes
+
+
+class BenchmarkResult:
+    def __init__(self, name, times, cold_queries, warm_queries, query_budget):
+        self.name = name
+        self.times = np.array(times) * 1000
+        self.cold_queries = cold_queries
+        self.warm_queries = warm_queries
+        self.query_budget = query_budget
+
+    def percentile(self, q):
+        return float(np.percentile(self.times, q)) if len(self.times) else 0.0
+
+    def as_dict(self):
+        return {
+            'p50_ms': round(self.percentile(50), 3),
+            'p95_ms': round(self.percentile(95), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'cold_queries': self.cold_queries,
+            'warm_queries': self.warm_queries,
+        }
+
+
+class Environment:
+    """Users, places and clients the scenarios share."""
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+        from reviews.models import Review
+        from .models import Place
+
+        busiest = (
+            Review.objects.order_by().values('user').annotate(reviews=Count('id')).order_by('-reviews').first()
+        )
+        self.place = Place.objects.filter(is_approved=True).order_by('-review_count', 'pk').first()
+        if busiest is None or self.place is None:
+            raise BenchmarkError('The database has no reviews or approved places to benchmark.')
+        self.user = get_user_model().objects.get(pk=busiest['user'])
+        self.place_ids = list(
+            Place.objects.filter(is_approved=True).order_by('pk').values_list('pk', flat=True)[:500]
+        )
+        self.saved = 0
+
+        self.client = Client()
+        _login(self.client, self.user)
+        self.anonymous = Client()
+
+
+def _login(client, user):
+    """Log ``client`` in as ``user`` without ``login()``, which updates ``last_login``."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+def _get(name, *args, **params):
+    def run(env):
+        response = env.client.get(reverse(name, args=[arg(env) for arg in args]), params)
+        if response.status_code != 200:
+            raise BenchmarkError(f'{name} returned {response.status_code}')
+    return run
+
+
+def _save_review(env):
+    from reviews.models import Review
+
+    place_id = env.place_ids[env.saved % len(env.place_ids)]
+    env.saved += 1
+    Review.objects.create(user=env.user, place_id=place_id, rating=env.saved % 5 + 1, comment='Benchmark')
+
+
+def _login_lookup(env):
+    # An unknown login measures the user lookup without password hashing
+    response = env.anonymous.post(reverse('users:login'), {'login': 'nobody@example.com', 'password': 'x'})
+    if response.status_code != 200:
+        raise BenchmarkError(f'login returned {response.status_code}')
+
+
+SCENARIOS = [
+    # The nearby carousel makes one COUNT per widening step, more on sparse data
+    Scenario('home', _get('places:home'), 20),
+    Scenario('search', _get('places:search'), 5),
+    Scenario('search_text', _get('places:search', q='biryani'), 6),
+    Scenario('search_filters', _get(
+        'places:search', location=['gandhipuram', 'rs_puram'], price='economical', type='food', min_rating=3,
+    ), 5),
+    Scenario('search_tags', _get('places:search', tag=['veg', 'wifi'], tag_mode='all'), 6),
+    Scenario('search_results', _get('places:search_results', limit=24), 5),
+    Scenario('place_detail', _get('places:place_detail', lambda env: env.place.pk), 6),
+    Scenario('profile', _get('users:profile'), 4),
+    Scenario('review_save', _save_review, 2, writes=True),
+    Scenario('login_lookup', _login_lookup, 1),
+]
+
+
+def get_scenarios(names=None, read_only=False):
+    """The named scenarios, or all of them; ``read_only`` leaves out those that write."""
+    if not names:
+        return [scenario for scenario in SCENARIOS if not (read_only and scenario.writes)]
+    known = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = set(names) - set(known)
+    if unknown:
+        raise BenchmarkError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    scenarios = [known[name] for name in names]
+    writing = [scenario.name for scenario in scenarios if scenario.writes]
+    if read_only and writing:
+        raise BenchmarkError(f"Scenarios that write cannot run read-only: {', '.join(writing)}")
+    return scenarios
+
+
+def _capture():
+    # The query log is a bounded deque; a full one would make counts read zero
+    reset_queries()
+    return CaptureQueriesContext(connection)
+
+
+def measure(scenario, env, runs=DEFAULT_RUNS, warmup=DEFAULT_WARMUP):
+    cache.clear()
+    with _capture() as queries:
+        scenario.run(env)
+    # Counts read the live log, which the next capture clears
+    cold_queries = len(queries)
+    for _ in range(warmup):
+        scenario.run(env)
+
+    times = []
+    warm_queries = 0
+    for _ in range(runs):
+        with _capture() as queries:
+            start = time.perf_counter()
+            scenario.run(env)
+            times.append(time.perf_counter() - start)
+        warm_queries = max(warm_queries, len(queries))
+    return BenchmarkResult(scenario.name, times, cold_queries, warm_queries, scenario.query_budget)
+
+
+def run_benchmarks(names=None, runs=DEFAULT_RUNS, warmup=DEFAULT_WARMUP, progress=None, read_only=False):
+    """Measure the named scenarios (all by default); returns a list of ``BenchmarkResult``.
+
+    Pass ``read_only`` for a database whose data must not change; see the
+    module docstring.
+    """
+    scenarios = get_scenarios(names, read_only)
+    with override_settings(**(READ_ONLY_SETTINGS if read_only else {})):
+        env = Environment()
+        results = []
+        for scenario in scenarios:
+            result = measure(scenario, env, runs, warmup)
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
+
+
+def check_results(results, baseline=None, threshold=DEFAULT_THRESHOLD):
+    """Return a list of problems: query budgets exceeded and regressions against ``baseline``."""
+    problems = []
+    baseline = (baseline or {}).get('results', {})
+    for result in results:
+        if result.cold_queries > result.query_budget:
+            problems.append(f'{result.name}: {result.cold_queries} queries, budget is {result.query_budget}')
+        previous = baseline.get(result.name)
+        if not previous:
+            continue
+        if result.warm_queries > previous['warm_queries']:
+            problems.append(f"{result.name}: {result.warm_queries} queries, baseline made {previous['warm_queries']}")
+        median, limit = result.percentile(50), previous['p50_ms'] * (1 + threshold)
+        if median > limit and median - previous['p50_ms'] >= MIN_REGRESSION_MS:
+            problems.append(f"{result.name}: median {median:.1f}ms, baseline {previous['p50_ms']:.1f}ms")
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def save_baseline(path, results, dataset):
+    data = {'dataset': dataset, 'results': {result.name: result.as_dict() for result in results}}
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write('\n')
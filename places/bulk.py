@@ -0,0 +1,95 @@
+"""Prepared-statement bulk writes for loaders that handle many thousands of rows.
+
+``bulk_create`` and ``bulk_update`` build an expression per row (a CASE
+per row and column for updates), which dominates at this scale. These
+helpers send one prepared statement through ``executemany`` instead. They
+skip ``save()`` and signals, so callers refresh derived data themselves.
+"""
+from django.db import connection
+from django.utils import timezone
+
+
+# Field types whose Python values the driver takes as they are
+PLAIN_TYPES = {
+    'AutoField', 'BigAutoField', 'BigIntegerField', 'BooleanField', 'CharField', 'FloatField', 'ForeignKey',
+    'IntegerField', 'PositiveIntegerField', 'PositiveSmallIntegerField', 'SmallIntegerField', 'TextField',
+}
+
+
+def _prep(field, value):
+    return field.get_db_prep_save(value, connection)
+
+
+def _insert_fields(model, columns):
+    given = [model._meta.get_field(name) for name in columns]
+    # An auto primary key left out is assigned by the database
+    rest = [
+        field for field in model._meta.concrete_fields
+        if field not in given and not (field.primary_key and field.get_internal_type() in ('AutoField', 'BigAutoField'))
+    ]
+    return given, rest
+
+
+def prepare_rows(model, columns, rows):
+    """Convert ``rows`` (tuples ordered like ``columns``) to database values.
+
+    Columns left out get their defaults. Values in ``PLAIN_TYPES`` columns
+    must already have the right Python type; they are passed through, as
+    per-value conversion costs more than the INSERT itself.
+    """
+    given, rest = _insert_fields(model, columns)
+    now = timezone.now()
+    defaults = [
+        _prep(field, now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+              else field.get_default())
+        for field in rest
+    ]
+    convert = [i for i, field in enumerate(given) if field.get_internal_type() not in PLAIN_TYPES]
+    prepared = []
+    for row in rows:
+        row = list(row)
+        for i in convert:
+            row[i] = _prep(given[i], row[i])
+        prepared.append(row + defaults)
+    return prepared
+
+
+def insert_rows(model, columns, rows, prepared=False):
+    """Insert ``rows`` with one prepared statement; see ``prepare_rows``."""
+    if not rows:
+        return
+    if not prepared:
+        rows = prepare_rows(model, columns, rows)
+    qn = connection.ops.quote_name
+    given, rest = _insert_fields(model, columns)
+    names = ', '.join(qn(field.column) for field in given + rest)
+    placeholders = ', '.join(['%s'] * (len(given) + len(rest)))
+    sql = f'INSERT INTO {qn(model._meta.db_table)} ({names}) VALUES ({placeholders})'
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def update_places(places, fields, bump_version=True):
+    """Write ``fields`` of many places with one prepared UPDATE.
+
+    With ``bump_version`` each place's version and ``updated_at`` change too,
+    which invalidates its cached detail page.
+    """
+    from .models import Place
+
+    if not places:
+        return
+    qn = connection.ops.quote_name
+    model_fields = [Place._meta.get_field(name) for name in fields]
+    assignments = [f'{qn(field.column)} = %s' for field in model_fields]
+    extra = []
+    if bump_version:
+        assignments += [f'{qn("version")} = {qn("version")} + 1', f'{qn("updated_at")} = %s']
+        extra = [_prep(Place._meta.get_field('updated_at'), timezone.now())]
+    sql = f'UPDATE {qn(Place._meta.db_table)} SET {", ".join(assignments)} WHERE {qn("id")} = %s'
+    params = [
+        [_prep(field, getattr(place, field.attname)) for field in model_fields] + extra + [place.pk]
+        for place in places
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
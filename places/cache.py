@@ -0,0 +1,92 @@
+"""Shared cache helpers for catalogue-derived data.
+
+Cached values are keyed by a catalogue version that is bumped whenever a
+place or review changes, so invalidation is a single counter increment
+rather than a hunt for every dependent key.
+"""
+import random
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+
+from citymate.metrics import record_cache_lookup
+
+CATALOGUE_VERSION_KEY = 'places:catalogue_version'
+# How long a rebuild may hold its lock, and how long others wait for it
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT = 2.0
+BUILD_POLL_INTERVAL = 0.05
+# Last good values are kept this long to serve while a rebuild is running
+STALE_TIMEOUT = 60 * 60
+
+
+def _initial_version():
+    # Random start so a flushed cache never reissues a version that
+    # in-process memos may still hold
+    return random.randint(1, 2 ** 31)
+
+
+def get_catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, _initial_version(), None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    try:
+        return cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOGUE_VERSION_KEY, _initial_version(), None)
+        return cache.incr(CATALOGUE_VERSION_KEY)
+
+
+def get_or_build(name, builder, timeout):
+    """Return the cached value for ``name`` at the current catalogue version.
+
+    Only one worker rebuilds an expired entry: it takes a short lock with
+    ``cache.add`` while the others serve the last good value, or wait briefly
+    for the new one if there is none.
+    """
+    key = f'{name}:v{get_catalogue_version()}'
+    value = cache.get(key)
+    record_cache_lookup(name.partition(':')[0], value is not None)
+    if value is not None:
+        return value
+
+    stale_key = f'{name}:stale'
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, timeout)
+            cache.set(stale_key, value, STALE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    value = cache.get(stale_key)
+    if value is not None:
+        return value
+
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return builder()
+
+
+def bump_place_versions(place_ids=None):
+    """Invalidate cached detail pages for the given places, or for all of them.
+
+    Only ``version`` changes: ``updated_at`` marks edits to the place's own
+    data, which incremental exports and Last-Modified headers rely on.
+    """
+    from .models import Place
+
+    places = Place.objects.all() if place_ids is None else Place.objects.filter(pk__in=list(place_ids))
+    places.update(version=F('version') + 1)
@@ -0,0 +1,80 @@
+"""Cached home page carousels.
+
+The place ids of each carousel and its rendered cards are cached at the
+current catalogue version. Cards show distances, so rendered fragments are
+shared per small geohash cell, measured from the cell centre. Cards also
+mark favourites, so fragments are keyed by which of their places the user
+has favourited; personalised carousels are additionally keyed by user and
+profile.
+"""
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import get_or_build
+from .favorites import favorites_digest, get_favorite_ids
+from .geo import annotate_distances, decode_geohash, encode_geohash, nearest_places
+from .recommend import profile_key, recommend_place_ids
+
+CAROUSEL_SIZE = 10
+CAROUSEL_TIMEOUT = 5 * 60
+# Cells of ~150m: fragments are shared by users this close to each other
+CAROUSEL_CELL_PRECISION = 7
+
+
+def _trending_ids(cell, user):
+    from .models import Place
+
+    places = Place.objects.filter(is_approved=True).order_by('-trending_score', '-id')
+    return list(places.values_list('pk', flat=True)[:CAROUSEL_SIZE])
+
+
+def _nearby_ids(cell, user):
+    return [place.pk for place in nearest_places(*decode_geohash(cell), k=CAROUSEL_SIZE)]
+
+
+def _recommendation_ids(cell, user):
+    # Cached per user by the recommendation engine itself
+    return recommend_place_ids(user, CAROUSEL_SIZE)
+
+
+CAROUSELS = {
+    # name: (id builder, what the ids depend on, empty message)
+    'recommendations': (_recommendation_ids, 'user', 'No recommendations available at the moment.'),
+    'trending': (_trending_ids, None, 'No trending places available right now.'),
+    'nearby': (_nearby_ids, 'cell', 'Could not determine nearby places.'),
+}
+
+
+def render_carousel(name, cell, user):
+    from .models import Place
+
+    builder, scope, empty_message = CAROUSELS[name]
+    if scope == 'user':
+        ids = builder(cell, user)
+    else:
+        ids_name = f'carousel:{name}:{cell}' if scope == 'cell' else f'carousel:{name}'
+        ids = get_or_build(ids_name, lambda: builder(cell, user), CAROUSEL_TIMEOUT)
+
+    # Users with the same favourites among these cards share the fragment
+    favorites = get_favorite_ids(user) & set(ids)
+    fragment_name = f'carousel_html:{name}:{cell}:{favorites_digest(favorites)}'
+    if scope == 'user':
+        fragment_name += f':{user.pk}:{profile_key(user)}'
+
+    def build_fragment():
+        places = Place.objects.in_bulk(ids)
+        ordered = [places[pk] for pk in ids if pk in places]
+        annotate_distances(ordered, *decode_geohash(cell))
+        return render_to_string('places/carousel.html', {
+            'places': ordered,
+            'empty_message': empty_message,
+            'favorite_ids': favorites,
+        })
+
+    return mark_safe(get_or_build(fragment_name, build_fragment, CAROUSEL_TIMEOUT))
+
+
+def home_carousels(lat, lon, user):
+    """Return ``{name: rendered cards}`` for every home page carousel."""
+    cell = encode_geohash(lat, lon, CAROUSEL_CELL_PRECISION)
+    return {name: render_carousel(name, cell, user) for name in CAROUSELS}
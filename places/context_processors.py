@@ -0,0 +1,9 @@
+from django.utils.functional import SimpleLazyObject
+
+from .favorites import get_favorite_ids
+
+
+def favorites(request):
+    """``favorite_ids`` for templates, loaded only if a template reads it."""
+    user = getattr(request, 'user', None)
+    return {'favorite_ids': SimpleLazyObject(lambda: get_favorite_ids(user))}
@@ -0,0 +1,138 @@
+"""Duplicate detection for submitted places.
+
+Every place's normalised name is split into trigrams, stored in
+``PlaceTrigram`` next to the place's coarse geohash cell. A lookup reads
+only the index entries for the submission's trigrams inside the 3x3 block
+of cells around it, counts shared trigrams per place in SQL, and scores
+the few best candidates exactly. Its cost depends on how many nearby
+places share trigrams with the name, not on the size of the catalogue.
+"""
+import math
+import re
+
+from .bulk import insert_rows
+from .geo import cell_block, encode_geohash, haversine_km
+
+# ~1.2km x 0.6km cells; their 3x3 block covers DUPLICATE_RADIUS_KM around a point
+TRIGRAM_CELL_PRECISION = 6
+DUPLICATE_RADIUS_KM = 0.5
+# Share of trigrams two names must have in common (Jaccard index)
+DUPLICATE_SIMILARITY = 0.5
+MAX_CANDIDATES = 20
+LOOKUP_INDEX = 'place_trigram_lookup_idx'
+
+
+def normalize_name(name):
+    """Lower-case, drop punctuation and collapse spaces: "Sri Ram's  Mess" -> "sri rams mess"."""
+    name = re.sub(r"['’]", '', name.lower())
+    return ' '.join(re.sub(r'[^\w]+', ' ', name).split())
+
+
+def trigrams(name):
+    """Trigrams of each word of the normalised name, padded like PostgreSQL's pg_trgm."""
+    grams = set()
+    for word in normalize_name(name).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard index of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def _cell(place):
+    geohash = place.geohash or encode_geohash(place.latitude, place.longitude)
+    return geohash[:TRIGRAM_CELL_PRECISION]
+
+
+def index_place_trigrams(places):
+    """Replace the trigram rows of ``places``; used by save signals and bulk loaders."""
+    from .models import PlaceTrigram
+
+    places = [place for place in places if place.pk is not None]
+    if not places:
+        return
+    PlaceTrigram.objects.filter(place__in=[place.pk for place in places]).delete()
+    _insert(places)
+
+
+def _insert(places):
+    from .models import PlaceTrigram
+
+    insert_rows(PlaceTrigram, ['place', 'trigram', 'cell'], [
+        (place.pk, gram, _cell(place))
+        for place in places
+        for gram in trigrams(place.name)
+    ], prepared=True)
+
+
+def rebuild_trigram_index(batch_size=2000):
+    """Re-create every trigram row in one transaction. Returns the number of places indexed.
+
+    The lookup index is dropped while the rows load and built again at the
+    end: sorting once is far cheaper than millions of inserts at random
+    positions in it.
+    """
+    from django.db import connection, transaction
+    from .models import Place, PlaceTrigram
+
+    index = next(index for index in PlaceTrigram._meta.indexes if index.name == LOOKUP_INDEX)
+    editor = connection.schema_editor()
+    batch = []
+    total = 0
+    places = Place.objects.only('id', 'name', 'latitude', 'longitude', 'geohash').order_by('pk')
+    with transaction.atomic(), connection.cursor() as cursor:
+        PlaceTrigram.objects.all().delete()
+        cursor.execute(editor.sql_delete_index % {
+            'name': editor.quote_name(index.name), 'table': editor.quote_name(PlaceTrigram._meta.db_table),
+        })
+        for place in places.iterator(chunk_size=batch_size):
+            batch.append(place)
+            if len(batch) >= batch_size:
+                _insert(batch)
+                total += len(batch)
+                batch = []
+        _insert(batch)
+        cursor.execute(str(index.create_sql(PlaceTrigram, editor)))
+    return total + len(batch)
+
+
+def find_duplicates(name, lat, lon, exclude=None, radius_km=DUPLICATE_RADIUS_KM,
+                    threshold=DUPLICATE_SIMILARITY):
+    """Places within ``radius_km`` whose names look like ``name``, most similar first.
+
+    Each returned place has ``similarity`` and ``distance`` (km) attributes.
+    """
+    from django.db.models import Count
+    from .models import Place, PlaceTrigram
+
+    grams = trigrams(name)
+    if not grams or lat is None or lon is None:
+        return []
+    # A Jaccard index of t needs at least t * len(grams) shared trigrams
+    min_shared = max(1, math.ceil(threshold * len(grams)))
+    candidates = (
+        PlaceTrigram.objects
+        .filter(cell__in=cell_block(lat, lon, TRIGRAM_CELL_PRECISION), trigram__in=grams)
+        .values('place_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared')
+    )
+    if exclude is not None:
+        candidates = candidates.exclude(place_id=exclude)
+    ids = [row['place_id'] for row in candidates[:MAX_CANDIDATES]]
+
+    matches = []
+    for place in Place.objects.filter(pk__in=ids):
+        place.similarity = similarity(grams, trigrams(place.name))
+        place.distance = haversine_km(lat, lon, place.latitude, place.longitude)
+        if place.similarity >= threshold and place.distance <= radius_km:
+            matches.append(place)
+    matches.sort(key=lambda place: (-place.similarity, place.distance))
+    return matches
@@ -0,0 +1,79 @@
+"""Facet counts for the search filter sidebar.
+
+All option counts for the current query come from one aggregate query made
+of conditional COUNTs. Each facet is counted with every other active filter
+applied but not its own, so selecting "Food" still shows how many "Stay"
+results there are. Results are cached per normalised query and catalogue
+version.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .areas import AREA_CHOICES
+from .cache import get_catalogue_version
+
+FACET_CACHE_TTL = 60
+RATING_THRESHOLDS = ('4', '3', '2')
+FACET_FIELDS = {'type': 'type', 'price': 'price_level', 'location': 'area'}
+
+
+def facet_options():
+    """Return ``{facet: {value: Q}}`` for every option shown in the sidebar."""
+    from .models import Place
+
+    return {
+        'type': {value: Q(type=value) for value, _ in Place.TYPE_CHOICES},
+        'price': {value: Q(price_level=value) for value, _ in Place.PRICE_LEVEL_CHOICES},
+        'min_rating': {value: Q(weighted_rating__gte=float(value)) for value in RATING_THRESHOLDS},
+        'location': {value: Q(area=value) for value, _ in AREA_CHOICES},
+    }
+
+
+def facet_q(name, values):
+    """Q object for the selected values of one facet; values are OR'd."""
+    if name == 'min_rating':
+        # Raw query-string values; anything but a listed threshold is ignored
+        thresholds = [float(value) for value in values if value in RATING_THRESHOLDS]
+        return Q(weighted_rating__gte=min(thresholds)) if thresholds else Q()
+    return Q(**{f'{FACET_FIELDS[name]}__in': values})
+
+
+def compute_facets(base, selected):
+    """Count every facet option over ``base`` in a single query."""
+    active = {name: facet_q(name, values) for name, values in selected.items() if values}
+    aggregates = {}
+    keys = []
+    for name, options in facet_options().items():
+        others = Q()
+        for other, condition in active.items():
+            if other != name:
+                others &= condition
+        for value, condition in options.items():
+            alias = f'facet_{len(keys)}'
+            aggregates[alias] = Count('pk', filter=condition & others)
+            keys.append((alias, name, value))
+
+    row = base.order_by().aggregate(**aggregates)
+    facets = {}
+    for alias, name, value in keys:
+        facets.setdefault(name, {})[value] = row[alias]
+    return facets
+
+
+def facet_cache_key(query, tags, tag_mode, selected):
+    normalized = {
+        'q': ' '.join(query.lower().split()),
+        'tags': sorted(tags),
+        'tag_mode': tag_mode,
+        'selected': {name: sorted(values) for name, values in selected.items() if values},
+    }
+    digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f'facets:{get_catalogue_version()}:{digest}'
+
+
+def get_facets(base, query, tags, tag_mode, selected):
+    key = facet_cache_key(query, tags, tag_mode, selected)
+    return cache.get_or_set(key, lambda: compute_facets(base, selected), FACET_CACHE_TTL)
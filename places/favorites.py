@@ -0,0 +1,56 @@
+"""Per-user sets of favourite place ids, kept in the shared cache.
+
+Templates mark favourites with a set membership check, so cards never
+query ``Place.favorites`` themselves. The ``m2m_changed`` receiver in
+``places.models`` drops a user's set whenever their favourites change,
+and the next read loads it again in one query.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from citymate.metrics import record_cache_lookup
+
+FAVORITES_TIMEOUT = 24 * 60 * 60
+
+
+def favorites_cache_key(user_id):
+    return f'favorites:{user_id}'
+
+
+def get_favorite_ids(user):
+    """Ids of the places ``user`` has favourited, as a frozenset."""
+    from .models import Place
+
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    key = favorites_cache_key(user.pk)
+    ids = cache.get(key)
+    record_cache_lookup('favorites', ids is not None)
+    if ids is None:
+        links = Place.favorites.through.objects.filter(user_id=user.pk)
+        ids = frozenset(links.values_list('place_id', flat=True))
+        cache.set(key, ids, FAVORITES_TIMEOUT)
+    return ids
+
+
+def invalidate_favorites(user_ids):
+    cache.delete_many([favorites_cache_key(user_id) for user_id in user_ids])
+
+
+def favorites_digest(place_ids):
+    """Short key part naming which of a fragment's places are favourites."""
+    if not place_ids:
+        return 'nofav'
+    joined = ','.join(str(pk) for pk in sorted(place_ids))
+    return hashlib.md5(joined.encode()).hexdigest()[:10]
+
+
+def toggle_favorite(user, place):
+    """Add or remove ``place`` from the user's favourites; returns the new state."""
+    # Decided from the database: a worker's cached set may be behind
+    if place.favorites.filter(pk=user.pk).exists():
+        place.favorites.remove(user)
+        return False
+    place.favorites.add(user)
+    return True
@@ -0,0 +1,294 @@
+"""Synthetic catalogue data for load testing.
+
+Users, places and reviews are generated in fixed-size chunks of id ranges.
+Each chunk draws from its own random stream derived from the seed, the
+table and the chunk number, so a dataset is reproducible whatever the
+number of worker processes. Workers only generate rows; the parent
+process writes them, one prepared multi-row INSERT per chunk, which also
+keeps SQLite (a single-writer database) usable.
+
+Distributions aim at the shapes that matter for query plans and caches:
+places cluster around the known areas plus a few random hot spots, tag
+use and place popularity follow power laws, and ratings scatter around a
+per-place quality.
+"""
+import multiprocessing
+from datetime import timedelta
+
+import numpy as np
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .areas import AREAS, assign_area
+from .bulk import insert_rows, prepare_rows
+from .geo import encode_geohash
+
+DEFAULT_CHUNK_SIZE = 20000
+# Extra clusters besides the registered areas, and their spread in degrees
+EXTRA_CLUSTERS = 12
+CLUSTER_SPREAD = (0.004, 0.02)
+CITY_BOUNDS = ((10.90, 11.12), (76.88, 77.10))
+# Popularity exponent: the review share of the place ranked r is ~ r^-a
+POPULARITY_EXPONENT = 0.8
+# Reviews are spread over this many days, most of them recent
+REVIEW_HISTORY_DAYS = 730
+REVIEW_AGE_SCALE_DAYS = 180
+
+TAG_VOCABULARY = [
+    'veg', 'non-veg', 'biryani', 'south indian', 'north indian', 'chettinad', 'thali', 'tiffin', 'coffee',
+    'tea', 'bakery', 'desserts', 'street food', 'late-night', 'family', 'budget', 'wifi', 'ac', 'parking',
+    'students', 'girls', 'boys', 'working professionals', 'furnished', 'food included', 'laundry',
+    'quiet', 'cozy', 'spicy', 'healthy', 'juice', 'snacks', 'meals', 'takeaway', 'delivery', 'rooftop',
+]
+NAME_PREFIXES = [
+    'Sri', 'New', 'Annapoorna', 'Kovai', 'Royal', 'Green', 'Golden', 'Lakshmi', 'City', 'Hill View', 'Star',
+    'Amma', 'Classic', 'Urban', 'Sunrise', 'Meenakshi', 'Ganesh', 'Balaji', 'Grand', 'Park',
+]
+SUB_TYPES = {'food': ['mess', 'bakery', 'stall'], 'stay': ['hotel', 'pg', 'hostel', 'rental']}
+TYPE_WEIGHTS = {'food': 0.7, 'stay': 0.3}
+PRICE_WEIGHTS = {'economical': 0.45, 'average': 0.4, 'premium': 0.15}
+REVIEW_COMMENTS = [
+    '', '', 'Great food and quick service.', 'Decent for the price.', 'Clean rooms, friendly staff.',
+    'Would come back.', 'Too crowded on weekends.', 'Overpriced.', 'Hidden gem!',
+]
+
+# Shared with worker processes by the pool initializer
+_state = {}
+
+
+def _rng(config, table, chunk):
+    return np.random.default_rng([config['seed'], table, chunk])
+
+
+def _weighted(rng, weights, size):
+    keys = list(weights)
+    return np.array(keys)[rng.choice(len(keys), size=size, p=list(weights.values()))]
+
+
+def _tags(rng, count, vocabulary_weights):
+    picks = rng.choice(len(TAG_VOCABULARY), size=(count, 4), p=vocabulary_weights)
+    sizes = rng.integers(1, 5, size=count)
+    return [sorted(set(row[:size].tolist())) for row, size in zip(picks, sizes)]
+
+
+def make_config(seed, places, users, reviews, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Everything workers need, including the id ranges to write into."""
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from django.db.models import Max
+    from reviews.models import Review
+    from .models import Place
+    from .tags import get_tag_ids
+
+    rng = np.random.default_rng([seed, 0])
+    centres = [(lat, lon, CLUSTER_SPREAD[1] / 2) for _, lat, lon in AREAS.values()]
+    for _ in range(EXTRA_CLUSTERS):
+        lat = rng.uniform(*CITY_BOUNDS[0])
+        lon = rng.uniform(*CITY_BOUNDS[1])
+        centres.append((lat, lon, rng.uniform(*CLUSTER_SPREAD)))
+    cluster_weights = rng.pareto(1.5, len(centres)) + 1
+    ranks = np.arange(1, len(TAG_VOCABULARY) + 1, dtype=float)
+
+    def next_id(model):
+        return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    tag_ids = get_tag_ids(TAG_VOCABULARY)
+    return {
+        'seed': seed,
+        'chunk_size': chunk_size,
+        'counts': {'users': users, 'places': places, 'reviews': reviews},
+        'first_id': {
+            'users': next_id(get_user_model()),
+            'places': next_id(Place),
+            'reviews': next_id(Review),
+        },
+        'centres': centres,
+        'cluster_weights': (cluster_weights / cluster_weights.sum()).tolist(),
+        'tag_weights': (1 / ranks / (1 / ranks).sum()).tolist(),
+        'tag_ids': [tag_ids[name] for name in TAG_VOCABULARY],
+        'now': timezone.now(),
+        # Every generated user shares one hash; hashing is deliberately slow
+        'password': make_password('loadtest'),
+    }
+
+
+def generate_users(config, chunk, start, count):
+    rng = _rng(config, 1, chunk)
+    areas = list(AREAS) + [None]
+    area_picks = rng.integers(0, len(areas), size=count)
+    prices = _weighted(rng, PRICE_WEIGHTS, count)
+    tags = _tags(rng, count, config['tag_weights'])
+    users, links = [], []
+    for i in range(count):
+        pk = start + i
+        names = [TAG_VOCABULARY[t] for t in tags[i][:2]]
+        users.append((
+            pk, f'loadtest{pk}', f'loadtest{pk}@example.com', areas[area_picks[i]], str(prices[i]),
+            ', '.join(names), config['password'],
+        ))
+        links.extend((pk, config['tag_ids'][t]) for t in tags[i][:2])
+    return users, links
+
+
+def generate_places(config, chunk, start, count):
+    rng = _rng(config, 2, chunk)
+    centres = np.array(config['centres'])
+    picks = rng.choice(len(centres), size=count, p=config['cluster_weights'])
+    lats = centres[picks, 0] + rng.normal(0, 1, count) * centres[picks, 2]
+    lons = centres[picks, 1] + rng.normal(0, 1, count) * centres[picks, 2]
+    types = _weighted(rng, TYPE_WEIGHTS, count)
+    prices = _weighted(rng, PRICE_WEIGHTS, count)
+    sub_picks = rng.integers(0, 4, size=count)
+    prefixes = rng.integers(0, len(NAME_PREFIXES), size=count)
+    approved = rng.random(count) < 0.95
+    tags = _tags(rng, count, config['tag_weights'])
+
+    places, links = [], []
+    for i in range(count):
+        pk = start + i
+        kind = str(types[i])
+        sub_type = SUB_TYPES[kind][sub_picks[i] % len(SUB_TYPES[kind])]
+        lat, lon = float(lats[i]), float(lons[i])
+        area = assign_area(lat, lon)
+        names = [TAG_VOCABULARY[t] for t in tags[i]]
+        places.append((
+            pk, f'{NAME_PREFIXES[prefixes[i]]} {sub_type.title()} {pk}', kind, sub_type,
+            f'{pk} Main Road, {AREAS[area][0] if area in AREAS else "Coimbatore"}',
+            lat, lon, str(prices[i]), f'A {", ".join(names)} {sub_type} in Coimbatore.',
+            ', '.join(names), bool(approved[i]), encode_geohash(lat, lon), area, config['now'],
+        ))
+        links.extend((pk, config['tag_ids'][t]) for t in tags[i])
+    return places, links
+
+
+def generate_reviews(config, chunk, start, count):
+    rng = _rng(config, 3, chunk)
+    n_places = config['counts']['places']
+    n_users = config['counts']['users']
+    a = 1 - POPULARITY_EXPONENT
+    # Inverse CDF of a continuous power law over ranks [1, n]
+    ranks = ((n_places ** a - 1) * rng.random(count) + 1) ** (1 / a) - 1
+    place_index = _state['popularity'][np.minimum(ranks.astype(np.int64), n_places - 1)]
+    # Some users write far more reviews than others
+    user_index = np.minimum((rng.random(count) ** 2 * n_users).astype(np.int64), n_users - 1)
+    ratings = np.clip(np.rint(_state['quality'][place_index] + rng.normal(0, 0.9, count)), 1, 5).astype(int)
+    ages = np.minimum(rng.exponential(REVIEW_AGE_SCALE_DAYS, count), REVIEW_HISTORY_DAYS)
+    comments = rng.integers(0, len(REVIEW_COMMENTS), size=count)
+
+    now = config['now']
+    place_ids = place_index + config['first_id']['places']
+    user_ids = user_index + config['first_id']['users']
+    return [
+        (start + i, int(user_ids[i]), int(place_ids[i]), int(ratings[i]), REVIEW_COMMENTS[comments[i]],
+         now - timedelta(days=float(ages[i])))
+        for i in range(count)
+    ], []
+
+
+def _init_worker(quality, popularity):
+    _state['quality'] = quality
+    _state['popularity'] = popularity
+
+
+GENERATORS = {
+    'users': generate_users,
+    'places': generate_places,
+    'reviews': generate_reviews,
+}
+
+
+def _generate(args):
+    """Build one chunk, already converted to database values."""
+    table, config, chunk, start, count = args
+    model, columns, link_model, link_columns = _targets()[table]
+    rows, links = GENERATORS[table](config, chunk, start, count)
+    if link_model is not None:
+        links = prepare_rows(link_model, link_columns, links)
+    return count, prepare_rows(model, columns, rows), links
+
+
+def _targets():
+    from django.contrib.auth import get_user_model
+    from reviews.models import Review
+    from .models import Place, PlaceTag, UserTasteTag
+
+    return {
+        'users': (
+            get_user_model(), ['id', 'username', 'email', 'preferred_area', 'preferred_price', 'taste_tags',
+                                 'password'],
+            UserTasteTag, ['user', 'tag'],
+        ),
+        'places': (
+            Place, ['id', 'name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level',
+                    'description', 'tags', 'is_approved', 'geohash', 'area', 'updated_at'],
+            PlaceTag, ['place', 'tag'],
+        ),
+        'reviews': (Review, ['id', 'user', 'place', 'rating', 'comment', 'created_at'], None, None),
+    }
+
+
+def _tasks(config, table):
+    total = config['counts'][table]
+    size = config['chunk_size']
+    first = config['first_id'][table]
+    for chunk, offset in enumerate(range(0, total, size)):
+        yield table, config, chunk, first + offset, min(size, total - offset)
+
+
+def generate_dataset(config, workers=1, progress=None):
+    """Generate and write users, places and reviews; returns rows written per table."""
+    targets = _targets()
+    rng = np.random.default_rng([config['seed'], 4])
+    n_places = max(config['counts']['places'], 1)
+    quality = np.clip(rng.normal(3.7, 0.6, n_places), 1.5, 4.9)
+    popularity = rng.permutation(n_places)
+    if not config['counts']['places'] or not config['counts']['users']:
+        config = dict(config, counts=dict(config['counts'], reviews=0))
+
+    pool = None
+    if workers > 1:
+        # Forked children must not share the parent's database connection
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(quality, popularity))
+    else:
+        _init_worker(quality, popularity)
+
+    written = {}
+    try:
+        for table in ('users', 'places', 'reviews'):
+            model, columns, link_model, link_columns = targets[table]
+            tasks = _tasks(config, table)
+            results = pool.imap_unordered(_generate, tasks) if pool else map(_generate, tasks)
+            written[table] = 0
+            for count, rows, links in results:
+                with transaction.atomic():
+                    insert_rows(model, columns, rows, prepared=True)
+                    if link_model is not None:
+                        insert_rows(link_model, link_columns, links, prepared=True)
+                written[table] += count
+                if progress:
+                    progress(table, written[table], config['counts'][table])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return written
+
+
+def refresh_derived_data():
+    """Rebuild the aggregates and indexes that bulk writes skipped."""
+    from .cache import bump_catalogue_version
+    from .duplicates import rebuild_trigram_index
+    from .ratings import recompute_ratings
+    from .sampling import invalidate_sample_pools
+    from .search import rebuild_search_index
+    from .trending import update_trending_scores
+
+    # One transaction, so SQLite syncs to disk once rather than per statement
+    with transaction.atomic():
+        recompute_ratings()
+        update_trending_scores(rebuild=True)
+        rebuild_search_index()
+        rebuild_trigram_index()
+    invalidate_sample_pools()
+    bump_catalogue_version()
@@ -0,0 +1,217 @@
+"""Geohash cells, nearest-neighbour lookups and batch distances for places."""
+import math
+
+import numpy as np
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# Finest cell size the nearest-neighbour search starts from (~150m x 150m)
+SEARCH_PRECISION = 7
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Encode a coordinate into a geohash string of the given length."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def decode_geohash(geohash):
+    """Return the centre (lat, lon) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (bits >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            target[1 - bit] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def cell_size(precision):
+    """Return the (height, width) of a geohash cell in degrees."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cell_block(lat, lon, precision):
+    """Return the cell containing the point and its eight neighbours."""
+    height, width = cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            cell_lat = min(max(lat + dy * height, -90.0), 90.0)
+            cell_lon = (lon + dx * width + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def covered_radius_km(lat, precision):
+    """Radius around a point that is guaranteed to lie inside its cell block."""
+    height, width = cell_size(precision)
+    return min(height, width * math.cos(math.radians(lat))) * KM_PER_DEGREE
+
+
+def cells_q(cells, field='geohash'):
+    """Build a Q object matching every geohash that starts with one of the cells.
+
+    Prefixes are turned into ranges rather than LIKE so the index is used.
+    """
+    from django.db.models import Q
+
+    query = Q()
+    for cell in cells:
+        query |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '{'})
+    return query
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_km_array(lat, lon, lats, lons):
+    """Vectorised great-circle distances from one point to arrays of points."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box_q(lat, lon, max_km):
+    """Q object for the lat/lon box enclosing a circle of ``max_km`` around a point."""
+    from django.db.models import Q
+
+    d_lat = max_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    d_lon = 180.0 if cos_lat < 1e-6 else min(max_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return Q(
+        latitude__gte=lat - d_lat, latitude__lte=lat + d_lat,
+        longitude__gte=lon - d_lon, longitude__lte=lon + d_lon,
+    )
+
+
+def batch_distances(lat, lon, places, max_km=None):
+    """Return ``{pk: km}`` from the point to every place in ``places``.
+
+    ``places`` may be a queryset or a list of primary keys. Coordinates are
+    fetched in one query and measured in a single NumPy pass. With ``max_km``
+    the query is narrowed by a bounding box first and places further away are
+    left out of the result.
+    """
+    from .models import Place
+
+    if not hasattr(places, 'values_list'):
+        places = Place.objects.filter(pk__in=list(places))
+    if max_km is not None:
+        places = places.filter(bounding_box_q(lat, lon, max_km))
+
+    rows = np.array(list(places.values_list('pk', 'latitude', 'longitude')), dtype=np.float64)
+    if not len(rows):
+        return {}
+    distances = haversine_km_array(lat, lon, rows[:, 1], rows[:, 2])
+    pks = rows[:, 0].astype(np.int64)
+    if max_km is not None:
+        within = distances <= max_km
+        pks, distances = pks[within], distances[within]
+    return dict(zip(pks.tolist(), distances.tolist()))
+
+
+def annotate_distances(places, lat, lon):
+    """Set ``distance`` (km) on already loaded places without extra queries."""
+    places = list(places)
+    if not places:
+        return places
+    lats = [p.latitude if p.latitude is not None else np.nan for p in places]
+    lons = [p.longitude if p.longitude is not None else np.nan for p in places]
+    distances = haversine_km_array(lat, lon, lats, lons)
+    for place, dist in zip(places, distances.tolist()):
+        place.distance = None if math.isnan(dist) else dist
+    return places
+
+
+def _rank(lat, lon, rows, k):
+    rows = np.array(list(rows), dtype=np.float64)
+    if not len(rows):
+        return []
+    distances = haversine_km_array(lat, lon, rows[:, 1], rows[:, 2])
+    if len(distances) > k:
+        top = np.argpartition(distances, k - 1)[:k]
+    else:
+        top = np.arange(len(distances))
+    top = top[np.argsort(distances[top], kind='stable')]
+    return [(float(distances[i]), int(rows[i, 0])) for i in top]
+
+
+def nearest_places(lat, lon, k=10, queryset=None):
+    """Return the ``k`` places closest to the point, nearest first.
+
+    Candidates are read from the 3x3 block of geohash cells around the point,
+    starting from small cells and widening until the block holds ``k`` places
+    and the k-th distance lies inside the block. Each returned place has a
+    ``distance`` attribute in kilometres.
+    """
+    from .models import Place
+
+    if queryset is None:
+        queryset = Place.objects.filter(is_approved=True)
+
+    ranked = []
+    for precision in range(SEARCH_PRECISION, 0, -1):
+        candidates = queryset.filter(cells_q(cell_block(lat, lon, precision)))
+        if precision > 1 and candidates.count() < k:
+            continue
+        ranked = _rank(lat, lon, candidates.values_list('pk', 'latitude', 'longitude'), k)
+        if len(ranked) == k and ranked[-1][0] <= covered_radius_km(lat, precision):
+            break
+    else:
+        # Even the coarsest block was not enough; fall back to the whole set.
+        ranked = _rank(lat, lon, queryset.values_list('pk', 'latitude', 'longitude'), k)
+
+    places = queryset.in_bulk([pk for _, pk in ranked])
+    results = []
+    for dist, pk in ranked:
+        place = places[pk]
+        place.distance = dist
+        results.append(place)
+    return results
@@ -0,0 +1,245 @@
+"""Bulk import of places from CSV or NDJSON.
+
+Input is streamed and handled in batches: each batch is validated, matched
+against places already known, and written with ``bulk_create`` and one
+prepared UPDATE inside a single transaction. Bulk writes bypass the model
+signals, so tags, the search index and name trigrams are synced per batch
+and the shared caches are invalidated once at the end.
+
+A row matches an existing place when their normalised names are equal and
+their coordinates fall in the same or a neighbouring ~150m geohash cell.
+"""
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from .bulk import update_places
+from .cache import bump_catalogue_version
+from .duplicates import index_place_trigrams, normalize_name
+from .geo import cell_block
+from .sampling import invalidate_sample_pools
+from .search import index_places
+from .tags import parse_tags, sync_place_tags
+
+DEFAULT_BATCH_SIZE = 2000
+# Geohash precision of the proximity key; cells are about 150m across
+DEDUPE_PRECISION = 7
+
+IMPORT_FIELDS = [
+    'name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level',
+    'description', 'contact_info', 'photo_url', 'tags',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, dict)`` for every record in ``stream``."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, RowError(f'invalid JSON: {exc}')
+            continue
+        yield number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def _choice(row, field, choices, default=None):
+    value = str(row.get(field) or '').strip().lower() or default
+    if value not in {key for key, _ in choices}:
+        raise RowError(f'{field}: {value!r} is not one of {", ".join(key for key, _ in choices)}')
+    return value
+
+
+def _text(row, field, max_length=None, required=False):
+    value = str(row.get(field) or '').strip()
+    if required and not value:
+        raise RowError(f'{field}: this field is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{field}: longer than {max_length} characters')
+    return value
+
+
+def _coordinate(row, field, limit):
+    try:
+        value = float(row.get(field))
+    except (TypeError, ValueError):
+        raise RowError(f'{field}: not a number')
+    if not -limit <= value <= limit:
+        raise RowError(f'{field}: out of range')
+    return value
+
+
+_validate_url = URLValidator()
+
+
+def clean_row(row):
+    """Validate one input record and return model field values."""
+    from .models import Place
+
+    if isinstance(row, RowError):
+        raise row
+    values = {
+        'name': _text(row, 'name', 255, required=True),
+        'type': _choice(row, 'type', Place.TYPE_CHOICES),
+        'sub_type': _choice(row, 'sub_type', Place.SUB_TYPE_CHOICES),
+        'address': _text(row, 'address', required=True),
+        'latitude': _coordinate(row, 'latitude', 90),
+        'longitude': _coordinate(row, 'longitude', 180),
+        'price_level': _choice(row, 'price_level', Place.PRICE_LEVEL_CHOICES, default='average'),
+        'description': _text(row, 'description'),
+        'contact_info': _text(row, 'contact_info', 255),
+        'photo_url': _text(row, 'photo_url') or None,
+        'tags': ', '.join(parse_tags(_text(row, 'tags'))),
+    }
+    if len(values['tags']) > 255:
+        raise RowError('tags: longer than 255 characters')
+    if values['photo_url']:
+        try:
+            _validate_url(values['photo_url'])
+        except ValidationError:
+            raise RowError('photo_url: not a valid URL')
+    return values
+
+
+class DedupeIndex:
+    """In-memory map of normalised name to ``{proximity cell: place id}``.
+
+    Places of the batch being written map to their unsaved instances.
+    """
+    def __init__(self):
+        self.names = {}
+
+    @classmethod
+    def from_database(cls, chunk_size=DEFAULT_BATCH_SIZE):
+        from .models import Place
+
+        index = cls()
+        rows = Place.objects.order_by().values_list('pk', 'name', 'geohash')
+        for pk, name, geohash in rows.iterator(chunk_size=chunk_size):
+            if geohash:
+                index.add(name, geohash, pk)
+        return index
+
+    def find(self, name, lat, lon):
+        """Id of a known place with this name near the point, if any."""
+        cells = self.names.get(normalize_name(name))
+        if not cells:
+            # Most rows have a new name; skip computing the neighbour cells
+            return None
+        for cell in cell_block(lat, lon, DEDUPE_PRECISION):
+            if cell in cells:
+                return cells[cell]
+        return None
+
+    def add(self, name, geohash, place):
+        self.names.setdefault(normalize_name(name), {})[geohash[:DEDUPE_PRECISION]] = place
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = self.created = self.updated = self.unchanged = self.skipped = 0
+        self.errors = []
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _write_batch(batch, index, stats, on_duplicate, approve, owner):
+    from .models import Place
+
+    to_create = []
+    to_update = {}
+    for number, values in batch:
+        match = index.find(values['name'], values['latitude'], values['longitude'])
+        if match is None:
+            place = Place(**values, is_approved=approve, added_by=owner)
+            place.populate_index_fields()
+            index.add(place.name, place.geohash, place)
+            to_create.append(place)
+        elif isinstance(match, Place):
+            # Repeated earlier in this batch; the later row wins
+            for field, value in values.items():
+                setattr(match, field, value)
+            match.populate_index_fields()
+            stats.skipped += 1
+        elif on_duplicate == 'skip':
+            stats.skipped += 1
+        else:
+            to_update[match] = values
+
+    with transaction.atomic():
+        Place.objects.bulk_create(to_create, batch_size=len(to_create) or None)
+        updated = []
+        if to_update:
+            for place in Place.objects.filter(pk__in=list(to_update)).only('pk', *IMPORT_FIELDS):
+                values = to_update[place.pk]
+                if all(getattr(place, field) == value for field, value in values.items()):
+                    stats.unchanged += 1
+                    continue
+                for field, value in values.items():
+                    setattr(place, field, value)
+                place.populate_index_fields()
+                updated.append(place)
+            update_places(updated, IMPORT_FIELDS + ['geohash', 'area'])
+        sync_place_tags(to_create + updated)
+        index_places(to_create + updated)
+        index_place_trigrams(to_create + updated)
+
+    for place in to_create:
+        index.add(place.name, place.geohash, place.pk)
+    stats.created += len(to_create)
+    stats.updated += len(updated)
+
+
+def import_places(rows, batch_size=DEFAULT_BATCH_SIZE, on_duplicate='update', approve=False,
+                  owner=None, progress=None):
+    """Import ``(line number, record)`` pairs; returns an ``ImportStats``.
+
+    Invalid rows are collected in ``stats.errors`` as ``(line, message)``
+    and do not stop the import. ``progress`` is called with the stats after
+    every batch.
+    """
+    stats = ImportStats()
+    index = DedupeIndex.from_database()
+    batch = []
+    for number, row in rows:
+        stats.rows += 1
+        try:
+            batch.append((number, clean_row(row)))
+        except RowError as exc:
+            stats.errors.append((number, str(exc)))
+            continue
+        if len(batch) >= batch_size:
+            _write_batch(batch, index, stats, on_duplicate, approve, owner)
+            batch = []
+            if progress:
+                progress(stats)
+    if batch:
+        _write_batch(batch, index, stats, on_duplicate, approve, owner)
+        if progress:
+            progress(stats)
+
+    if stats.created or stats.updated:
+        invalidate_sample_pools()
+        bump_catalogue_version()
+    return stats
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places.bulk import update_places
+from places.cache import bump_catalogue_version
+from places.duplicates import index_place_trigrams
+from places.models import Place
+from places.sampling import invalidate_sample_pools
+
+
+class Command(BaseCommand):
+    help = 'Recompute the geohash and area of every place from its coordinates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        checked = updated = 0
+
+        places = Place.objects.only('id', 'name', 'latitude', 'longitude', 'geohash', 'area').order_by('pk')
+        with transaction.atomic():
+            for place in places.iterator(chunk_size=batch_size):
+                stored = (place.geohash, place.area)
+                place.populate_index_fields()
+                checked += 1
+                if (place.geohash, place.area) != stored:
+                    batch.append(place)
+                if len(batch) >= batch_size:
+                    updated += self.write(batch)
+                    batch = []
+            updated += self.write(batch)
+
+        if updated:
+            # Bulk writes skip the save receivers that keep these in sync
+            invalidate_sample_pools()
+            bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} places, updated {updated}.'))
+
+    def write(self, places):
+        update_places(places, ['geohash', 'area'])
+        # Duplicate lookups store each name's trigrams under its geohash cell
+        index_place_trigrams(places)
+        return len(places)
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from places.models import Place
+from places.tags import sync_place_tags, sync_user_tags
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Populate the normalised tag tables from Place.tags and User.taste_tags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        places = Place.objects.only('id', 'tags').order_by('pk')
+        total = self._sync(places, sync_place_tags, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Synced tags for {total} places.'))
+
+        users = User.objects.only('id', 'taste_tags').order_by('pk')
+        total = self._sync(users, sync_user_tags, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Synced taste tags for {total} users.'))
+
+    def _sync(self, queryset, sync, batch_size):
+        batch = []
+        total = 0
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                sync(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            sync(batch)
+            total += len(batch)
+        return total
@@ -0,0 +1,93 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from places.benchmark import (
+    DEFAULT_RUNS, DEFAULT_THRESHOLD, DEFAULT_WARMUP, BenchmarkError, check_results, load_baseline, run_benchmarks,
+    save_baseline,
+)
+from places.generator import generate_dataset, make_config, refresh_derived_data
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'places', 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main views against a generated dataset, check query budgets and compare with a baseline. '
+        'Exits with an error when a budget is exceeded or a scenario regresses.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenario names; all by default.')
+        parser.add_argument('--places', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=200000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--existing', action='store_true',
+            help='Benchmark the configured database as it is instead of a generated test database. '
+                 'Scenarios that write are skipped, and a private in-memory cache and cookie sessions are '
+                 'used so neither the shared cache nor the database changes.',
+        )
+        parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+        parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed slowdown of the median, as a fraction of the baseline.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+        dataset = (
+            {'existing': True} if options['existing'] else
+            {name: options[name] for name in ('places', 'users', 'reviews', 'seed')}
+        )
+
+        # Timings with DEBUG on would include query logging
+        setup_test_environment(debug=False)
+        databases = None
+        try:
+            if not options['existing']:
+                databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+                self.stderr.write('Generating {places} places, {users} users and {reviews} reviews...'.format(**dataset))
+                generate_dataset(make_config(**dataset))
+                refresh_derived_data()
+            results = run_benchmarks(
+                options['scenarios'], options['runs'], options['warmup'], progress=self.report,
+                read_only=options['existing'],
+            )
+        except BenchmarkError as error:
+            raise CommandError(error)
+        finally:
+            if databases is not None:
+                teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results, dataset)
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}."))
+            problems = check_results(results)
+        else:
+            baseline = None
+            if os.path.exists(options['baseline']):
+                baseline = load_baseline(options['baseline'])
+                if baseline.get('dataset') != dataset:
+                    self.stderr.write(self.style.WARNING(
+                        'The baseline was recorded on a different dataset; only query budgets are checked.'
+                    ))
+                    baseline = None
+            problems = check_results(results, baseline, options['threshold'])
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} scenarios within budget.'))
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result.name:<16} p50 {result.percentile(50):8.2f}ms  p95 {result.percentile(95):8.2f}ms  '
+            f'p99 {result.percentile(99):8.2f}ms  queries {result.cold_queries} cold / {result.warm_queries} warm '
+            f'(budget {result.query_budget})'
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from places.cache import bump_catalogue_version
+from places.similarity import build_similarities
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "people who liked this also liked" neighbour table from reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=20, help='Neighbours kept per place.')
+        parser.add_argument('--block-size', type=int, default=1000, help='Places scored per sparse product.')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per database read and write.')
+        parser.add_argument('--min-support', type=int, default=2, help='Users who must have rated both places.')
+        parser.add_argument('--shrinkage', type=float, default=10.0)
+        parser.add_argument('--max-user-ratings', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = build_similarities(
+            top_n=options['top_n'],
+            block_size=options['block_size'],
+            chunk_size=options['chunk_size'],
+            min_support=options['min_support'],
+            shrinkage=options['shrinkage'],
+            max_user_ratings=options['max_user_ratings'],
+        )
+        bump_catalogue_version()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} neighbours in {elapsed:.1f}s.'))
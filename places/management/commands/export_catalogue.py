@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from places.export import DEFAULT_CHUNK_SIZE, EXPORTS, FORMATS, parse_since, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream places or reviews as NDJSON or CSV, optionally only rows changed since a date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--since', help='ISO date or datetime; only rows updated from then on.')
+        parser.add_argument('--output', help='File to write to; defaults to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        lines = stream_export(options['kind'], options['fmt'], since, options['chunk_size'])
+        count = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                for line in lines:
+                    out.write(line)
+                    count += 1
+        else:
+            for line in lines:
+                # Lines already end in a newline
+                self.stdout.write(line, ending='')
+                count += 1
+        self.stderr.write(f'Exported {count} lines.')
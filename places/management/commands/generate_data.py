@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places.generator import DEFAULT_CHUNK_SIZE, generate_dataset, make_config, refresh_derived_data
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalogue of users, places and reviews for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--places', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0, help='The same seed always produces the same data.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating rows in parallel.')
+
+    def handle(self, *args, **options):
+        if min(options['places'], options['users'], options['reviews']) < 0 or options['chunk_size'] < 1:
+            raise CommandError('Counts must not be negative and --chunk-size must be positive.')
+        started = time.monotonic()
+        config = make_config(
+            options['seed'], options['places'], options['users'], options['reviews'], options['chunk_size'],
+        )
+
+        def progress(table, done, total):
+            elapsed = time.monotonic() - started
+            self.stderr.write(f'{table}: {done}/{total} ({elapsed:.0f}s)')
+
+        written = generate_dataset(config, workers=options['workers'], progress=progress)
+        self.stderr.write('Rebuilding ratings, trending scores and the search index...')
+        refresh_derived_data()
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {written['users']} users, {written['places']} places and {written['reviews']} reviews "
+            f'in {time.monotonic() - started:.0f}s.'
+        ))
@@ -0,0 +1,60 @@
+import os
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from places.importer import DEFAULT_BATCH_SIZE, import_places, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import places from a CSV or NDJSON file, merging duplicates of known places.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for standard input.")
+        parser.add_argument('--format', dest='fmt', choices=['csv', 'ndjson'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--on-duplicate', choices=['update', 'skip'], default='update')
+        parser.add_argument('--approve', action='store_true', help='Mark imported places as approved.')
+        parser.add_argument('--owner', help='Username recorded as adding the places.')
+        parser.add_argument('--max-errors', type=int, default=50, help='Row errors to print.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        owner = None
+        if options['owner']:
+            try:
+                owner = get_user_model().objects.get(username=options['owner'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['owner']!r}.")
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+
+        def progress(stats):
+            self.stderr.write(f'{stats.rows} rows, {stats.rate:.0f} rows/s')
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            stats = import_places(
+                read_rows(stream, fmt),
+                batch_size=options['batch_size'],
+                on_duplicate=options['on_duplicate'],
+                approve=options['approve'],
+                owner=owner,
+                progress=progress,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for line, message in stats.errors[:options['max_errors']]:
+            self.stderr.write(self.style.WARNING(f'line {line}: {message}'))
+        if len(stats.errors) > options['max_errors']:
+            self.stderr.write(self.style.WARNING(f'... and {len(stats.errors) - options["max_errors"]} more errors'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {stats.rows} rows in {stats.elapsed:.1f}s ({stats.rate:.0f} rows/s): '
+            f'{stats.created} created, {stats.updated} updated, {stats.unchanged} unchanged, '
+            f'{stats.skipped} duplicates skipped, '
+            f'{len(stats.errors)} errors.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from places.search import rebuild_search_index, search_index_ready
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all places.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(batch_size=options['batch_size'])
+        if not search_index_ready():
+            self.stdout.write(self.style.WARNING('FTS5 is not available on this database; search uses substring matching.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} places.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from places.duplicates import rebuild_trigram_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the name trigram index used to detect duplicate place submissions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = rebuild_trigram_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} places.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from places.cache import bump_catalogue_version
+from places.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild review counts, rating sums and average ratings from the reviews table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fixed = recompute_ratings(batch_size=options['batch_size'])
+        if fixed:
+            bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(f'Corrected ratings for {fixed} places.'))
@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 from places.models import Place
+from places.ratings import recompute_ratings
 from reviews.models import Review
 
 User = get_user_model()
@@ -75,7 +76,6 @@ class Command(BaseCommand):
                 tags=pd['tags'],
                 photo_url=pd['photo_url'], 
                 is_approved=True,
-                average_rating=round(random.uniform(3.5, 5.0), 1),
                 added_by=owner
             )
             created_places.append(place)
@@ -102,5 +102,7 @@ class Command(BaseCommand):
                 reviews.append(rev)
 
         Review.objects.bulk_create(reviews)
+        # bulk_create skips the review signals, so fill in the aggregates here
+        recompute_ratings()
         self.stdout.write(self.style.SUCCESS(f'Added {len(reviews)} reviews.'))
         self.stdout.write(self.style.SUCCESS('Seeding complete.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from places.cache import bump_catalogue_version
+from places.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold reviews posted since the last run into place trending scores. '
+        'Meant to run every few minutes from cron or another scheduler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every score from all reviews.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        updated = update_trending_scores(rebuild=options['rebuild'], batch_size=options['batch_size'])
+        if updated:
+            bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {updated} places.'))
@@ -1,12 +1,22 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models import Avg
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from geopy.distance import distance as geopy_distance
+
+from .areas import AREA_CHOICES, assign_area
+from .cache import bump_catalogue_version, bump_place_versions
+from .duplicates import index_place_trigrams
+from .favorites import invalidate_favorites
+from .geo import encode_geohash, haversine_km
+from .ratings import apply_rating_delta
+from .sampling import invalidate_sample_pools
+from .search import FTS_TABLE, SearchDocumentField, index_place, unindex_place
+from .tags import parse_tags, sync_place_tags, sync_user_tags
 
 User = get_user_model()
 
+APPROVED = models.Q(is_approved=True)
+
 class Place(models.Model):
     TYPE_CHOICES = (('food', 'Food'), ('stay', 'Stay'))
     SUB_TYPE_CHOICES = (('mess', 'Mess'), ('bakery', 'Bakery'), ('stall', 'Stall'), ('hotel', 'Hotel'), ('pg', 'PG'), ('hostel', 'Hostel'), ('rental', 'Rental'))
@@ -29,28 +39,276 @@ class Place(models.Model):
     photo_url = models.URLField(null=True, blank=True)
 
     tags = models.CharField(max_length=255, blank=True, help_text="Comma-separated tags, e.g., cozy, late-night, wifi")
+    # Normalised copy of `tags`, kept in sync on save
+    tag_set = models.ManyToManyField('Tag', through='PlaceTag', related_name='places', blank=True)
 
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='added_places')
     is_approved = models.BooleanField(default=False)
     average_rating = models.FloatField(default=0.0)
+    # Running review aggregates; average_rating is derived from these
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    # Bayesian average used for ranking, see places.ratings
+    weighted_rating = models.FloatField(default=0.0, editable=False)
     favorites = models.ManyToManyField(User, related_name='favorite_places', blank=True)
     reported = models.BooleanField(default=False)
 
+    # Spatial index key, derived from latitude/longitude on save
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True)
+    # Locality from the shared area registry, derived from latitude/longitude on save
+    area = models.CharField(max_length=20, choices=AREA_CHOICES, blank=True, editable=False)
+    # Time-decayed review activity, maintained by the update_trending command
+    trending_score = models.FloatField(default=0.0, editable=False)
+    trending_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped whenever anything on the detail page changes; keys its cached body
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Partial indexes over approved places: Django renders is_approved=True
+        # as a bare boolean term, which SQLite cannot seek on as a leading
+        # index column but does match against the index condition. Sort keys
+        # are ascending so a backward scan yields (key DESC, id DESC), the
+        # order listings use, without a sort step.
+        indexes = [
+            models.Index(fields=['geohash'], condition=APPROVED, name='place_approved_geohash_idx'),
+            models.Index(fields=['area'], condition=APPROVED, name='place_approved_area_idx'),
+            models.Index(fields=['trending_score'], condition=APPROVED, name='place_approved_trending_idx'),
+            models.Index(fields=['weighted_rating'], condition=APPROVED, name='place_approved_rating_idx'),
+            models.Index(
+                fields=['type', 'weighted_rating'], condition=APPROVED, name='place_approved_type_rating_idx'
+            ),
+            models.Index(
+                fields=['price_level', 'weighted_rating'], condition=APPROVED, name='place_approved_price_idx'
+            ),
+            # Incremental exports
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.sub_type})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so receivers can tell what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def has_changed(self, *fields):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return True
+        return any(loaded.get(field) != getattr(self, field) for field in fields)
+
+    def save(self, *args, **kwargs):
+        self.populate_index_fields()
+        bump = not self._state.adding
+        if bump:
+            # Incremented in SQL so concurrent bumps are never lost
+            self.version = models.F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = set(update_fields)
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields |= {'geohash', 'area'}
+            if bump:
+                update_fields |= {'version', 'updated_at'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields if field.attname in self.__dict__
+        }
+
+    def _save_table(self, *args, **kwargs):
+        updated = super()._save_table(*args, **kwargs)
+        if hasattr(self.version, 'resolve_expression'):
+            # Read back the incremented version before post_save receivers see it
+            self.refresh_from_db(fields=['version'])
+        return updated
+
+    def populate_index_fields(self):
+        # Also called directly by bulk code paths, which bypass save()
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        self.area = assign_area(self.latitude, self.longitude)
+
     def get_tags_list(self):
-        return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+        if 'tag_set' in getattr(self, '_prefetched_objects_cache', {}):
+            return [tag.name for tag in self.tag_set.all()]
+        return parse_tags(self.tags)
 
     def calculate_distance(self, user_lat, user_lon):
+        # For whole result lists use geo.batch_distances / geo.annotate_distances
         if self.latitude and self.longitude and user_lat and user_lon:
-            return geopy_distance((self.latitude, self.longitude), (user_lat, user_lon)).km
+            return haversine_km(self.latitude, self.longitude, user_lat, user_lon)
         return None
 
-# Signal to update average_rating when a review is saved
+class PlaceSearchEntry(models.Model):
+    """A row of the FTS5 search index, so searches can join it; see places.search."""
+    place = models.OneToOneField(
+        Place, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column=FTS_TABLE)
+    # bm25() with the configured field weights; lower is more relevant
+    rank = models.FloatField()
+
+    class Meta:
+        # The virtual table is created by search.ensure_search_index
+        managed = False
+        db_table = FTS_TABLE
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    users = models.ManyToManyField(User, through='UserTasteTag', related_name='taste_tag_set', blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PlaceTag(models.Model):
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='place_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='place_tags')
+
+    class Meta:
+        # (tag, place) ordering doubles as the sorted posting list for a tag
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'place'], name='unique_place_tag'),
+        ]
+
+
+class UserTasteTag(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='taste_tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='user_links')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='unique_user_taste_tag'),
+        ]
+
+class PlaceTrigram(models.Model):
+    """One row per trigram of a place's normalised name, for duplicate lookups."""
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+    # Coarse geohash prefix, so lookups only read nearby places' trigrams
+    cell = models.CharField(max_length=6)
+
+    class Meta:
+        indexes = [
+            # Covers the lookup: shared trigrams per place without touching the table
+            models.Index(fields=['trigram', 'cell', 'place'], name='place_trigram_lookup_idx'),
+        ]
+
+
+class PlaceSimilarity(models.Model):
+    """Top item-item neighbours, rebuilt offline by build_similarities."""
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='similar_links')
+    neighbor = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['place', '-score']),
+        ]
+
+class TrendingProgress(models.Model):
+    """The last review folded into trending scores; a single row, see places.trending."""
+    last_review_id = models.PositiveBigIntegerField(default=0)
+
+# Keep the place rating aggregates in step with its reviews
+@receiver(post_save, sender='reviews.Review')
+def update_place_rating(sender, instance, created, **kwargs):
+    if created:
+        apply_rating_delta(instance.place_id, 1, instance.rating)
+    else:
+        old_place_id, old_rating = instance.loaded_rating()
+        if old_place_id != instance.place_id:
+            apply_rating_delta(old_place_id, -1, -old_rating)
+            apply_rating_delta(instance.place_id, 1, instance.rating)
+        elif old_rating != instance.rating:
+            apply_rating_delta(instance.place_id, 0, instance.rating - old_rating)
+        else:
+            # Only the comment changed
+            bump_place_versions([instance.place_id])
+    instance.remember_rating()
+
+
+@receiver(pre_delete, sender='reviews.Review')
+def remember_deleted_rating(sender, instance, **kwargs):
+    # Read while the row exists: deferred fields cannot be loaded once it is gone
+    instance._deleted_rating = instance.loaded_rating()
+
+
+@receiver(post_delete, sender='reviews.Review')
+def remove_place_rating(sender, instance, **kwargs):
+    place_id, rating = instance._deleted_rating
+    apply_rating_delta(place_id, -1, -rating)
+
+# Keep the full-text search index in sync with places
+@receiver(post_save, sender=Place)
+def update_search_index(sender, instance, **kwargs):
+    index_place(instance)
+
+
+@receiver(post_delete, sender=Place)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_place(instance.pk)
+
+
+@receiver(post_save, sender=Place)
+def update_place_trigrams(sender, instance, created, **kwargs):
+    if created or instance.has_changed('name', 'latitude', 'longitude'):
+        index_place_trigrams([instance])
+
+
+@receiver(post_save, sender=Place)
+def update_place_tags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'tags' in update_fields:
+        sync_place_tags([instance])
+
+
+@receiver(post_save, sender=User)
+def update_user_taste_tags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'taste_tags' in update_fields:
+        sync_user_tags([instance])
+
+
+@receiver(post_save, sender=Place)
+def refresh_sample_pools(sender, instance, created, **kwargs):
+    if (created and instance.is_approved) or (not created and instance.has_changed('is_approved', 'type')):
+        invalidate_sample_pools()
+
+
+@receiver(post_delete, sender=Place)
+def drop_from_sample_pools(sender, instance, **kwargs):
+    if instance.is_approved:
+        invalidate_sample_pools()
+
+
+# Cached carousels and facets are keyed by the catalogue version
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
 @receiver(post_save, sender='reviews.Review')
-def update_place_rating(sender, instance, **kwargs):
-    place = instance.place
-    average = place.reviews.aggregate(Avg('rating'))['rating__avg']
-    place.average_rating = average or 0.0
-    place.save(update_fields=['average_rating'])
\ No newline at end of file
+@receiver(post_delete, sender='reviews.Review')
+def invalidate_catalogue_caches(sender, **kwargs):
+    bump_catalogue_version()
+
+
+# Favourite counts and buttons are part of the detail page, and each
+# user's favourite ids are cached as a set
+@receiver(m2m_changed, sender=Place.favorites.through)
+def update_favorites(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The cleared rows are gone by post_clear, so note them now
+        related = instance.favorite_places if reverse else instance.favorites
+        instance._cleared_favorite_ids = list(related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    others = pk_set if action != 'post_clear' else getattr(instance, '_cleared_favorite_ids', [])
+    place_ids, user_ids = (others, [instance.pk]) if reverse else ([instance.pk], others)
+    bump_place_versions(place_ids)
+    invalidate_favorites(user_ids)
@@ -0,0 +1,123 @@
+"""Keyset (cursor) pagination for place listings.
+
+Pages are fetched with ``WHERE (sort keys) > (last row's keys) LIMIT n`` so
+every page costs the same however deep the client scrolls. The last
+ordering field must be unique (normally ``id``) to make the order stable.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    # Full precision; the ORM parses ISO strings back for date lookups
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    data = json.dumps(values, separators=(',', ':'), default=_encode_value).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def _ordering_field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def _cursor_values(queryset, ordering, values):
+    """Convert decoded cursor values to their fields' types."""
+    converted = []
+    for field, value in zip(ordering, values):
+        if value is None:
+            raise InvalidCursor(values)
+        model_field = _ordering_field(queryset, field.lstrip('-'))
+        try:
+            value = model_field.to_python(value)
+            # e.g. integers beyond the database's range
+            model_field.run_validators(value)
+        except ValidationError:
+            raise InvalidCursor(values)
+        converted.append(value)
+    return converted
+
+
+def _after(ordering, values):
+    """Q object selecting the rows that sort after ``values``."""
+    query = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            condition &= Q(**{previous.lstrip('-'): value})
+        query |= condition
+    return query
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return the page of ``queryset`` that follows ``cursor``.
+
+    Raises ``InvalidCursor`` if the cursor cannot be decoded or holds
+    values of the wrong type.
+    """
+    ordering = list(ordering)
+    if cursor:
+        values = _cursor_values(queryset, ordering, decode_cursor(cursor, len(ordering)))
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+    return KeysetPage(items, next_cursor)
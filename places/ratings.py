@@ -0,0 +1,102 @@
+"""Denormalised rating aggregates for places.
+
+Each place keeps ``review_count`` and ``rating_sum`` alongside
+``average_rating`` and ``weighted_rating``. Review signals apply deltas to
+all of them in a single UPDATE built from ``F()`` expressions, so
+concurrent writers never read a stale aggregate and no ``AVG()`` over the
+reviews table is needed.
+
+``weighted_rating`` is a Bayesian average: every place starts with
+``RATING_PRIOR_COUNT`` imaginary reviews of ``RATING_PRIOR_MEAN`` stars, so
+one five-star review does not outrank fifty four-star ones. It is the
+column listings sort and filter on.
+"""
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .bulk import update_places
+
+AGGREGATE_FIELDS = ['review_count', 'rating_sum', 'average_rating', 'weighted_rating']
+
+
+def rating_prior():
+    """``(mean, count)`` of the imaginary reviews every place starts with."""
+    return (
+        getattr(settings, 'RATING_PRIOR_MEAN', 3.5),
+        getattr(settings, 'RATING_PRIOR_COUNT', 5),
+    )
+
+
+def weighted_rating(count, total):
+    if not count:
+        return 0.0
+    mean, weight = rating_prior()
+    return (mean * weight + total) / (weight + count)
+
+
+def apply_rating_delta(place_id, count_delta, sum_delta):
+    """Add ``count_delta`` reviews totalling ``sum_delta`` stars to a place.
+
+    Also bumps the place version, as its reviews are part of the detail page.
+    """
+    from .models import Place
+
+    mean, weight = rating_prior()
+    count = F('review_count') + count_delta
+    total = F('rating_sum') + sum_delta
+    has_reviews = {'review_count__gt': -count_delta}
+
+    # Every right-hand side reads the row as it was before the UPDATE
+    Place.objects.filter(pk=place_id).update(
+        review_count=count,
+        rating_sum=total,
+        average_rating=Case(
+            When(**has_reviews, then=Cast(total, FloatField()) / count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        weighted_rating=Case(
+            When(**has_reviews, then=(Cast(total, FloatField()) + mean * weight) / (count + weight)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def recompute_ratings(batch_size=2000):
+    """Rebuild every place's aggregates from the reviews table.
+
+    Reads all totals in one grouped query. Returns the number of places
+    whose stored values were wrong.
+    """
+    from reviews.models import Review
+    from .models import Place
+
+    totals = {
+        row['place_id']: (row['count'], row['total'])
+        for row in Review.objects.order_by().values('place_id').annotate(count=Count('id'), total=Sum('rating'))
+    }
+
+    fixed = 0
+    batch = []
+    places = Place.objects.only('id', *AGGREGATE_FIELDS).order_by('pk')
+    for place in places.iterator(chunk_size=batch_size):
+        count, total = totals.get(place.pk, (0, 0))
+        values = (count, total, total / count if count else 0.0, weighted_rating(count, total))
+        if tuple(getattr(place, field) for field in AGGREGATE_FIELDS) == values:
+            continue
+        for field, value in zip(AGGREGATE_FIELDS, values):
+            setattr(place, field, value)
+        batch.append(place)
+        if len(batch) >= batch_size:
+            update_places(batch, AGGREGATE_FIELDS)
+            fixed += len(batch)
+            batch = []
+    if batch:
+        update_places(batch, AGGREGATE_FIELDS)
+        fixed += len(batch)
+    return fixed
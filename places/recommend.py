@@ -0,0 +1,152 @@
+"""Personalised place recommendations.
+
+Candidate places are encoded once per catalogue version as a feature
+matrix: common tags, price level, sub type, area and rating. Each user's
+profile becomes a preference vector over the same columns, and ranking is
+a single matrix-vector product. The matrix lives in process memory; the
+ranked ids are cached per user, profile and catalogue version.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+import numpy as np
+
+from .areas import AREA_CHOICES
+from .cache import get_catalogue_version, get_or_build
+from .sampling import sample_places
+from .tags import parse_tags
+
+# Highest rated approved places considered for recommendations
+POOL_SIZE = 20000
+# Most common tags used as features
+TAG_VOCABULARY_SIZE = 64
+RECOMMENDATION_TIMEOUT = 30 * 60
+
+TAG_WEIGHT = 1.0
+PRICE_WEIGHT = 0.8
+AREA_WEIGHT = 0.6
+SUB_TYPE_WEIGHT = 0.4
+RATING_WEIGHT = 0.5
+
+_matrix = {}
+_matrix_lock = threading.Lock()
+
+
+class FeatureMatrix:
+    def __init__(self, ids, matrix, columns):
+        self.ids = ids
+        self.matrix = matrix
+        # column name -> index, e.g. 'tag:cozy', 'price:average', 'rating'
+        self.columns = columns
+
+    def vector(self, weights):
+        vector = np.zeros(len(self.columns), dtype=np.float32)
+        for column, weight in weights.items():
+            if column in self.columns:
+                vector[self.columns[column]] += weight
+        return vector
+
+
+def build_feature_matrix():
+    from .models import Place, PlaceTag, Tag
+    from django.db.models import Count
+
+    pool = Place.objects.filter(is_approved=True).order_by('-weighted_rating', '-id')[:POOL_SIZE]
+    rows = list(pool.values_list('pk', 'price_level', 'sub_type', 'area', 'weighted_rating'))
+
+    vocabulary = list(
+        Tag.objects.annotate(uses=Count('place_tags')).order_by('-uses', 'name')
+        .values_list('pk', 'name')[:TAG_VOCABULARY_SIZE]
+    )
+    columns = {}
+    for _, name in vocabulary:
+        columns[f'tag:{name}'] = len(columns)
+    for value, _ in Place.PRICE_LEVEL_CHOICES:
+        columns[f'price:{value}'] = len(columns)
+    for value, _ in Place.SUB_TYPE_CHOICES:
+        columns[f'sub_type:{value}'] = len(columns)
+    for value, _ in AREA_CHOICES:
+        columns[f'area:{value}'] = len(columns)
+    columns['rating'] = len(columns)
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = np.zeros((len(rows), len(columns)), dtype=np.float32)
+    position = {pk: i for i, pk in enumerate(ids.tolist())}
+    for i, (_, price, sub_type, area, rating) in enumerate(rows):
+        for column in (f'price:{price}', f'sub_type:{sub_type}', f'area:{area}'):
+            if column in columns:
+                matrix[i, columns[column]] = 1.0
+        matrix[i, columns['rating']] = (rating or 0.0) / 5
+
+    tag_columns = {pk: columns[f'tag:{name}'] for pk, name in vocabulary}
+    links = PlaceTag.objects.filter(tag_id__in=list(tag_columns), place__in=pool.values('pk'))
+    for place_id, tag_id in links.values_list('place_id', 'tag_id'):
+        if place_id in position:
+            matrix[position[place_id], tag_columns[tag_id]] = 1.0
+
+    return FeatureMatrix(ids, matrix, columns)
+
+
+def get_feature_matrix():
+    version = get_catalogue_version()
+    with _matrix_lock:
+        if _matrix.get('version') != version:
+            _matrix['matrix'] = build_feature_matrix()
+            _matrix['version'] = version
+        return _matrix['matrix']
+
+
+def preference_weights(user):
+    """Column weights describing what ``user`` likes."""
+    from reviews.models import Review
+
+    weights = {'rating': RATING_WEIGHT}
+    tags = parse_tags(user.taste_tags)
+    for tag in tags:
+        weights[f'tag:{tag}'] = TAG_WEIGHT / len(tags)
+    if user.preferred_price:
+        weights[f'price:{user.preferred_price}'] = PRICE_WEIGHT
+    if user.preferred_area:
+        weights[f'area:{user.preferred_area}'] = AREA_WEIGHT
+
+    liked = Review.objects.filter(user=user, rating__gte=4).values_list('place__sub_type', flat=True)
+    liked = Counter(liked[:200])
+    total = sum(liked.values())
+    for sub_type, count in liked.items():
+        weights[f'sub_type:{sub_type}'] = SUB_TYPE_WEIGHT * count / total
+    return weights
+
+
+def profile_key(user):
+    profile = '|'.join([user.taste_tags or '', user.preferred_price or '', user.preferred_area or ''])
+    return hashlib.md5(profile.encode()).hexdigest()[:12]
+
+
+def rank_places(user, k):
+    from reviews.models import Review
+
+    weights = preference_weights(user)
+    if set(weights) == {'rating'}:
+        # Nothing known about the user yet: show a random mix of food places
+        return [place.pk for place in sample_places(k, 'food')]
+
+    features = get_feature_matrix()
+    if not len(features.ids):
+        return []
+    scores = features.matrix @ features.vector(weights)
+
+    reviewed = set(Review.objects.filter(user=user).values_list('place_id', flat=True))
+    if reviewed:
+        scores[np.isin(features.ids, list(reviewed))] = -np.inf
+
+    count = min(k, len(scores))
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [int(features.ids[i]) for i in top if np.isfinite(scores[i])]
+
+
+def recommend_place_ids(user, k=10):
+    """Ids of the ``k`` places that best match the user's profile, best first."""
+    name = f'recommendations:{user.pk}:{profile_key(user)}:{k}'
+    return get_or_build(name, lambda: rank_places(user, k), RECOMMENDATION_TIMEOUT)
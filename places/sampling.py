@@ -0,0 +1,80 @@
+"""Random samples of approved places without ORDER BY RANDOM().
+
+The ids of approved places (overall and per type) are cached as a pool
+split into fixed-size chunks. A sample draws random positions and fetches
+only the chunks holding them, then loads the rows by primary key, so the
+cost does not grow with the catalogue. Pools are dropped when a place is
+approved, unapproved, retyped or deleted and rebuilt on the next draw.
+"""
+import random
+import uuid
+
+from django.core.cache import cache
+
+from citymate.metrics import record_cache_lookup
+
+POOL_CHUNK_SIZE = 1000
+POOL_TIMEOUT = 60 * 60
+ALL_TYPES = 'all'
+
+
+def _pool_key(place_type):
+    return f'sample_pool:{place_type or ALL_TYPES}'
+
+
+def _build_pool(place_type):
+    from .models import Place
+
+    places = Place.objects.filter(is_approved=True)
+    if place_type:
+        places = places.filter(type=place_type)
+    ids = list(places.order_by().values_list('pk', flat=True))
+
+    key = _pool_key(place_type)
+    token = uuid.uuid4().hex[:12]
+    chunks = {
+        f'{key}:{token}:{start // POOL_CHUNK_SIZE}': ids[start:start + POOL_CHUNK_SIZE]
+        for start in range(0, len(ids), POOL_CHUNK_SIZE)
+    }
+    cache.set_many(chunks, POOL_TIMEOUT)
+    pool = {'token': token, 'size': len(ids), 'chunk_size': POOL_CHUNK_SIZE}
+    cache.set(key, pool, POOL_TIMEOUT)
+    return pool
+
+
+def sample_place_ids(k, place_type=None):
+    """Draw up to ``k`` distinct random ids of approved places."""
+    key = _pool_key(place_type)
+    pool = cache.get(key)
+    record_cache_lookup('sample_pool', pool is not None)
+    for attempt in range(2):
+        if pool is None:
+            pool = _build_pool(place_type)
+        if not pool['size']:
+            return []
+
+        size = pool['chunk_size']
+        positions = random.sample(range(pool['size']), min(k, pool['size']))
+        chunk_keys = {pos // size: f"{key}:{pool['token']}:{pos // size}" for pos in positions}
+        chunks = cache.get_many(chunk_keys.values())
+        if len(chunks) == len(chunk_keys):
+            return [chunks[chunk_keys[pos // size]][pos % size] for pos in positions]
+        # A chunk was evicted; rebuild the whole pool and draw again
+        pool = None
+    return []
+
+
+def sample_places(k, place_type=None):
+    """Return up to ``k`` random approved places."""
+    from .models import Place
+
+    ids = sample_place_ids(k, place_type)
+    # Re-check approval in case a place changed through a path that skips signals
+    places = Place.objects.filter(is_approved=True).in_bulk(ids)
+    return [places[pk] for pk in ids if pk in places]
+
+
+def invalidate_sample_pools():
+    from .models import Place
+
+    cache.delete_many([_pool_key(None)] + [_pool_key(value) for value, _ in Place.TYPE_CHOICES])
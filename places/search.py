@@ -0,0 +1,170 @@
+"""Full-text search over places backed by an SQLite FTS5 index.
+
+The index lives in a separate virtual table keyed by the place id and is
+kept in sync by the signals in ``places.models``. Searches join it through
+the unmanaged ``PlaceSearchEntry`` model, so every other filter, the
+relevance order and pagination all run in the same SQL query. On databases
+without FTS5 the search falls back to substring matching.
+"""
+import re
+
+from django.db import OperationalError, connection
+from django.db.models import F, Lookup, Q, TextField
+
+FTS_TABLE = 'places_place_fts'
+# bm25() column weights, in FTS column order: name, tags, description
+FIELD_WEIGHTS = (10.0, 5.0, 1.0)
+
+_index_ready = None
+
+
+def search_index_ready():
+    global _index_ready
+    if _index_ready is None:
+        if connection.vendor != 'sqlite':
+            _index_ready = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                _index_ready = cursor.fetchone() is not None
+    return _index_ready
+
+
+def ensure_search_index(**kwargs):
+    """Create the FTS5 table if missing; connected to ``post_migrate``."""
+    global _index_ready
+    if connection.vendor != 'sqlite':
+        _index_ready = False
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, tags, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            # The hidden rank column, which searches order by, uses these weights
+            weights = ', '.join(str(w) for w in FIELD_WEIGHTS)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', %s)", [f'bm25({weights})']
+            )
+        _index_ready = True
+    except OperationalError:
+        # SQLite built without FTS5
+        _index_ready = False
+
+
+def _document(place):
+    return [place.pk, place.name or '', (place.tags or '').replace(',', ' '), place.description or '']
+
+
+def index_place(place):
+    if not search_index_ready():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [place.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, tags, description) VALUES (%s, %s, %s, %s)",
+            _document(place),
+        )
+
+
+def index_places(places):
+    """Index many places at once; used by bulk loaders that bypass signals."""
+    if not search_index_ready():
+        return
+    documents = [_document(place) for place in places]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[doc[0]] for doc in documents])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, tags, description) VALUES (%s, %s, %s, %s)",
+            documents,
+        )
+
+
+def unindex_place(pk):
+    if not search_index_ready():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild_search_index(batch_size=2000):
+    """Drop and re-create every index entry. Returns the number of places indexed."""
+    from .models import Place
+
+    ensure_search_index()
+    if not search_index_ready():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    batch = []
+    total = 0
+    places = Place.objects.only('id', 'name', 'tags', 'description').order_by('pk')
+    for place in places.iterator(chunk_size=batch_size):
+        batch.append(place)
+        if len(batch) >= batch_size:
+            index_places(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        index_places(batch)
+        total += len(batch)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class SearchDocumentField(TextField):
+    """The FTS table's hidden column named after the table; ``__match`` runs a full-text query."""
+
+
+SearchDocumentField.register_lookup(Match)
+
+
+def search_place_ids(query):
+    """Return ids of places matching ``query``, best match first."""
+    from .models import Place
+
+    return list(search_places(Place.objects.all(), query).values_list('pk', flat=True))
+
+
+def search_places(queryset, query):
+    """Filter ``queryset`` to places matching ``query``, ordered by relevance.
+
+    Matching rows carry a ``search_rank`` annotation; lower ranks are better.
+    """
+    if not search_index_ready():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(tags__icontains=query)
+        )
+
+    expression = build_match_expression(query)
+    if not expression:
+        return queryset.none()
+    return (
+        queryset.filter(search_entry__document__match=expression)
+        .annotate(search_rank=F('search_entry__rank'))
+        .order_by('search_rank', 'pk')
+    )
@@ -5,25 +5,54 @@ import os
 
 User = get_user_model()
 
-class PlaceSerializer(serializers.ModelSerializer):
+
+def requested_fields(request):
+    """Field names asked for with ``?fields=a,b``, or None for all fields."""
+    value = request.query_params.get('fields') if request is not None else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Drop every field not listed in the request's ``?fields=`` parameter."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get('request'))
+        if wanted:
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class PlaceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     added_by = serializers.StringRelatedField() 
     is_favorited = serializers.SerializerMethodField()  
+    distance = serializers.SerializerMethodField()
 
     class Meta:
         model = Place
-        fields = '__all__'
+        # Many-to-many fields would cost a query per place
+        exclude = ['favorites', 'tag_set']
 
     def get_is_favorited(self, obj):
+        # Views serialising many places pass the user's favourites in one set
+        favorite_ids = self.context.get('favorite_ids')
+        if favorite_ids is not None:
+            return obj.pk in favorite_ids
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.favorites.filter(id=user.id).exists()
         return False
 
+    def get_distance(self, obj):
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 3) if distance is not None else None
+
 class PlaceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Place
-        fields = ['name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level', 'description', 'contact_info', 'photos']
+        fields = ['name', 'type', 'sub_type', 'address', 'latitude', 'longitude', 'price_level', 'description', 'contact_info', 'photo']
 
     def create(self, validated_data):
         validated_data['added_by'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
@@ -0,0 +1,133 @@
+"""Item-item collaborative filtering over reviews.
+
+Reviews are streamed into a sparse user x place matrix, centred on each
+user's mean rating (adjusted cosine), and column-normalised. Similarities
+are computed one block of places at a time as sparse products, so memory
+is bounded by the block size rather than the square of the catalogue.
+Only the top neighbours of each place are stored in ``PlaceSimilarity``.
+"""
+from array import array
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+
+from .cache import bump_place_versions
+
+
+def load_rating_matrix(chunk_size=50000, max_user_ratings=1000):
+    """Return ``(matrix, place_ids)``: a CSR users x places matrix of ratings.
+
+    Repeat reviews of a place by one user are averaged. Users with more than
+    ``max_user_ratings`` reviews are dropped, as they add little signal and
+    most of the pairwise cost.
+    """
+    from reviews.models import Review
+
+    users, places, ratings = array('q'), array('q'), array('d')
+    rows = Review.objects.order_by().values_list('user_id', 'place_id', 'rating')
+    for user_id, place_id, rating in rows.iterator(chunk_size=chunk_size):
+        users.append(user_id)
+        places.append(place_id)
+        ratings.append(rating)
+
+    users = np.frombuffer(users, dtype=np.int64)
+    places = np.frombuffer(places, dtype=np.int64)
+    ratings = np.frombuffer(ratings, dtype=np.float64)
+    if not len(ratings):
+        return sparse.csr_matrix((0, 0)), np.array([], dtype=np.int64)
+
+    _, user_index = np.unique(users, return_inverse=True)
+    place_ids, place_index = np.unique(places, return_inverse=True)
+    shape = (user_index.max() + 1, len(place_ids))
+
+    totals = sparse.csr_matrix((ratings, (user_index, place_index)), shape=shape)
+    counts = sparse.csr_matrix((np.ones_like(ratings), (user_index, place_index)), shape=shape)
+    matrix = totals.copy()
+    matrix.data = totals.data / counts.data
+
+    per_user = np.diff(matrix.indptr)
+    if max_user_ratings and (per_user > max_user_ratings).any():
+        keep = sparse.diags((per_user <= max_user_ratings).astype(np.float64))
+        matrix = (keep @ matrix).tocsr()
+        matrix.eliminate_zeros()
+    return matrix, place_ids
+
+
+def normalise(matrix):
+    """Centre each user's ratings on their mean and scale columns to unit length."""
+    matrix = matrix.tocsr(copy=True).astype(np.float64)
+    per_user = np.diff(matrix.indptr)
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    means = np.divide(sums, per_user, out=np.zeros_like(sums), where=per_user > 0)
+    matrix.data -= np.repeat(means, per_user)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (matrix @ sparse.diags(scale)).tocsc()
+
+
+def top_neighbours(matrix, top_n=20, block_size=1000, min_support=2, shrinkage=10.0):
+    """Yield ``(place index, [(neighbour index, score), ...])`` for each place.
+
+    Scores are shrunk towards zero when few users rated both places:
+    ``score * support / (support + shrinkage)``.
+    """
+    rated = matrix.copy()
+    rated.data = np.ones_like(rated.data)
+    rated_t = rated.T.tocsr()
+    normalised_t = matrix.T.tocsr()
+
+    for start in range(0, matrix.shape[1], block_size):
+        stop = min(start + block_size, matrix.shape[1])
+        scores = (normalised_t[start:stop] @ matrix).tocsr()
+        support = (rated_t[start:stop] @ rated).tocsr()
+        scores.sort_indices()
+        support.sort_indices()
+        for offset in range(stop - start):
+            place = start + offset
+            lo, hi = scores.indptr[offset], scores.indptr[offset + 1]
+            neighbours, values = scores.indices[lo:hi], scores.data[lo:hi]
+            if not len(neighbours):
+                yield place, []
+                continue
+            # Every scored pair was co-rated, so it has a support entry too
+            s_lo, s_hi = support.indptr[offset], support.indptr[offset + 1]
+            positions = np.searchsorted(support.indices[s_lo:s_hi], neighbours)
+            together = support.data[s_lo:s_hi][positions]
+            values = values * together / (together + shrinkage)
+            keep = (neighbours != place) & (together >= min_support) & (values > 0)
+            neighbours, values = neighbours[keep], values[keep]
+            if len(values) > top_n:
+                best = np.argpartition(-values, top_n - 1)[:top_n]
+                neighbours, values = neighbours[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            yield place, list(zip(neighbours[order].tolist(), values[order].tolist()))
+
+
+def build_similarities(top_n=20, block_size=1000, chunk_size=50000, min_support=2,
+                       shrinkage=10.0, max_user_ratings=1000):
+    """Replace the neighbour table. Returns the number of rows written."""
+    from .models import PlaceSimilarity
+
+    ratings, place_ids = load_rating_matrix(chunk_size, max_user_ratings)
+    written = 0
+    with transaction.atomic():
+        PlaceSimilarity.objects.all().delete()
+        if not len(place_ids):
+            return 0
+        batch = []
+        for place, neighbours in top_neighbours(normalise(ratings), top_n, block_size, min_support, shrinkage):
+            batch.extend(
+                PlaceSimilarity(place_id=int(place_ids[place]), neighbor_id=int(place_ids[neighbour]), score=score)
+                for neighbour, score in neighbours
+            )
+            if len(batch) >= chunk_size:
+                PlaceSimilarity.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        PlaceSimilarity.objects.bulk_create(batch)
+        written += len(batch)
+        # Neighbours are shown on every detail page
+        bump_place_versions()
+    return written
@@ -0,0 +1,93 @@
+"""Normalised tags for places and user tastes, plus tag filtering.
+
+``Place.tags`` and ``User.taste_tags`` stay the editable comma-separated
+source; these helpers mirror them into the ``Tag`` table so filters can use
+exact, indexed lookups instead of substring matching.
+"""
+from django.db.models import Count
+
+
+def normalize_tag(name):
+    return ' '.join(name.lower().split())
+
+
+def parse_tags(value):
+    """Split a comma-separated string into unique normalised tag names."""
+    tags = []
+    for part in (value or '').split(','):
+        tag = normalize_tag(part)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def get_tag_ids(names):
+    """Return ``{name: id}``, creating any tags that do not exist yet."""
+    from .models import Tag
+
+    names = set(names)
+    if not names:
+        return {}
+    existing = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - set(existing)
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        existing.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return existing
+
+
+def _sync_links(link_model, owner_field, owners, tag_strings):
+    """Make the link rows for ``owners`` match their tag strings."""
+    wanted = {owner.pk: parse_tags(tag_strings(owner)) for owner in owners}
+    tag_ids = get_tag_ids(name for names in wanted.values() for name in names)
+
+    current = {}
+    links = link_model.objects.filter(**{f'{owner_field}__in': list(wanted)})
+    for owner_id, tag_id in links.values_list(owner_field, 'tag_id'):
+        current.setdefault(owner_id, set()).add(tag_id)
+
+    to_create = []
+    for owner_id, names in wanted.items():
+        target = {tag_ids[name] for name in names}
+        existing = current.get(owner_id, set())
+        stale = existing - target
+        if stale:
+            link_model.objects.filter(**{owner_field: owner_id}, tag_id__in=stale).delete()
+        to_create.extend(
+            link_model(**{f'{owner_field}_id': owner_id}, tag_id=tag_id) for tag_id in target - existing
+        )
+    link_model.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def sync_place_tags(places):
+    from .models import PlaceTag
+
+    _sync_links(PlaceTag, 'place', places, lambda place: place.tags)
+
+
+def sync_user_tags(users):
+    from .models import UserTasteTag
+
+    _sync_links(UserTasteTag, 'user', users, lambda user: user.taste_tags)
+
+
+def match_tags(names, mode='all'):
+    """Subquery of the ids of places carrying all (``mode='all'``) or any of the tags.
+
+    It reads the (tag, place) index in the database, so no id lists pass
+    through Python however common the tags are.
+    """
+    from .models import PlaceTag
+
+    names = {normalize_tag(name) for name in names}
+    links = PlaceTag.objects.filter(tag__name__in=names)
+    if mode != 'any':
+        links = links.values('place_id').annotate(tags=Count('tag_id')).filter(tags=len(names))
+    return links.order_by().values('place_id')
+
+
+def filter_by_tags(queryset, names, mode='all'):
+    names = [name for name in (normalize_tag(n) for n in names) if name]
+    if not names:
+        return queryset
+    return queryset.filter(pk__in=match_tags(names, mode))
@@ -1,8 +1,48 @@
-from django.test import TestCase
+from django.contrib import admin
+from django.contrib.sessions.models import Session
+from django.test import RequestFactory, TestCase
+from django.http import HttpResponse
+from citymate import metrics, profiling
+from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Place
+from .models import Place, PlaceSimilarity, PlaceTag, PlaceTrigram, Tag
+from .duplicates import find_duplicates, rebuild_trigram_index
+from .tags import match_tags, parse_tags
+from .areas import AREA_CHOICES, assign_area
+from .pagination import MAX_PAGE_SIZE, encode_cursor, get_page_size
+from .facets import compute_facets, get_facets
+from .cache import bump_catalogue_version, get_or_build
+from .trending import update_trending_scores
+from .ratings import recompute_ratings, weighted_rating
+from .recommend import rank_places, recommend_place_ids
+from .similarity import build_similarities
+from .favorites import favorites_cache_key, get_favorite_ids, toggle_favorite
+from .export import parse_since, stream_export
+from .importer import import_places
+from .generator import TAG_VOCABULARY, generate_dataset, make_config, refresh_derived_data
+from .benchmark import SCENARIOS, BenchmarkError, BenchmarkResult, check_results, run_benchmarks
+from .views import get_review_page
+from reviews.models import Review
+from datetime import timedelta
+from django.utils import timezone
+from . import sampling
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from .search import search_place_ids, search_places
+from .geo import annotate_distances, batch_distances, encode_geohash, haversine_km, nearest_places
 from django.contrib.auth import get_user_model
+import random
+import os
+import subprocess
+import tempfile
+import csv
+import io
+import json
+from django.core.management import call_command
 
 User = get_user_model()
 
@@ -47,4 +87,1294 @@ class PlaceTests(TestCase):
         response = self.client.post(f'/places/{self.place.pk}/report/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.place.refresh_from_db()
-        self.assertTrue(self.place.reported)
\ No newline at end of file
+        self.assertTrue(self.place.reported)
+
+
+class GeoIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='geouser', password='pass')
+        rng = random.Random(7)
+        for i in range(200):
+            Place.objects.create(
+                name=f'Place {i}', type='food', sub_type='mess', address='Coimbatore',
+                latitude=11.0 + rng.uniform(-0.2, 0.2), longitude=76.95 + rng.uniform(-0.2, 0.2),
+                price_level='average', is_approved=i % 10 != 0,
+            )
+
+    def test_encode_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_geohash_kept_up_to_date(self):
+        place = Place.objects.first()
+        place.latitude, place.longitude = 11.0168, 76.9558
+        place.save(update_fields=['latitude', 'longitude'])
+        place.refresh_from_db()
+        self.assertEqual(place.geohash, encode_geohash(11.0168, 76.9558))
+
+    def test_nearest_places_matches_brute_force(self):
+        origin = (11.02, 76.97)
+        expected = sorted(
+            Place.objects.filter(is_approved=True),
+            key=lambda p: haversine_km(*origin, p.latitude, p.longitude),
+        )[:10]
+        result = nearest_places(*origin, k=10)
+        self.assertEqual([p.pk for p in result], [p.pk for p in expected])
+        self.assertTrue(all(p.is_approved for p in result))
+
+    def test_nearest_places_with_sparse_data(self):
+        result = nearest_places(40.0, -74.0, k=5)
+        self.assertEqual(len(result), 5)
+
+    def test_home_uses_location(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        response = self.client.get('/places/', {'lat': 11.1, 'lon': 77.1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session['user_location'], [11.1, 77.1])
+        nearest = nearest_places(11.1, 77.1, k=1)[0]
+        self.assertContains(response, nearest.name)
+
+
+    def test_batch_distances(self):
+        origin = (11.0, 76.95)
+        places = Place.objects.all()
+        distances = batch_distances(*origin, places)
+        self.assertEqual(len(distances), places.count())
+        for place in places[:20]:
+            self.assertAlmostEqual(distances[place.pk], place.calculate_distance(*origin), places=6)
+
+        ids = list(places.values_list('pk', flat=True)[:30])
+        self.assertEqual(set(batch_distances(*origin, ids)), set(ids))
+
+        nearby = batch_distances(*origin, places, max_km=5)
+        self.assertTrue(nearby)
+        self.assertTrue(all(km <= 5 for km in nearby.values()))
+        self.assertEqual(set(nearby), {pk for pk, km in distances.items() if km <= 5})
+
+    def test_annotate_distances(self):
+        places = annotate_distances(Place.objects.all()[:5], 11.0, 76.95)
+        for place in places:
+            self.assertAlmostEqual(place.distance, place.calculate_distance(11.0, 76.95))
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pass')
+        common = dict(type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+                      longitude=76.95, price_level='average', is_approved=True)
+        self.by_name = Place.objects.create(name='Biryani House', **common)
+        self.by_tag = Place.objects.create(name='Corner Stall', tags='biryani,spicy', **common)
+        self.by_description = Place.objects.create(
+            name='Quiet Mess', description='Serves a decent biryani on Sundays.', **common
+        )
+        self.other = Place.objects.create(name='Annapoorna', tags='vegetarian', **common)
+
+    def test_ranking_weights_fields(self):
+        ids = search_place_ids('biryani')
+        self.assertEqual(ids, [self.by_name.pk, self.by_tag.pk, self.by_description.pk])
+
+    def test_prefix_matching(self):
+        self.assertEqual(search_place_ids('anna'), [self.other.pk])
+        self.assertEqual(search_place_ids('veg'), [self.other.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.other.name = 'Gowrishankar'
+        self.other.save()
+        self.assertEqual(search_place_ids('anna'), [])
+        self.assertEqual(search_place_ids('gowri'), [self.other.pk])
+        self.other.delete()
+        self.assertEqual(search_place_ids('gowri'), [])
+
+    def test_search_places_respects_filters(self):
+        self.by_tag.is_approved = False
+        self.by_tag.save()
+        results = search_places(Place.objects.filter(is_approved=True), 'biryani')
+        self.assertEqual(list(results), [self.by_name, self.by_description])
+
+    def test_search_view_orders_by_relevance(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/places/search/', {'q': 'biryani'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [p.pk for p in response.context['results']],
+            [self.by_name.pk, self.by_tag.pk, self.by_description.pk],
+        )
+
+    def test_pages_reach_every_match(self):
+        common = dict(type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+                      longitude=76.95, price_level='average', is_approved=True)
+        for i in range(25):
+            Place.objects.create(name=f'Biryani Point {i}', **common)
+        self.client.force_login(self.user)
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get('/places/search/results/', {'q': 'biryani', 'limit': 10, 'cursor': cursor})
+            data = response.json()
+            seen.extend(response.context['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 28)
+        self.assertEqual([place.pk for place in seen], search_place_ids('biryani'))
+        ranks = [place.search_rank for place in seen]
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_search_view_without_index(self):
+        self.by_tag.weighted_rating = 4.0
+        self.by_tag.save()
+        self.client.force_login(self.user)
+        with mock.patch('places.search._index_ready', False):
+            response = self.client.get('/places/search/', {'q': 'biryani'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [p.pk for p in response.context['results']],
+                [self.by_tag.pk, self.by_description.pk, self.by_name.pk],
+            )
+            cursor = encode_cursor([0.0, self.by_description.pk])
+            response = self.client.get('/places/search/results/', {'q': 'biryani', 'cursor': cursor})
+            self.assertEqual(response.json()['count'], 1)
+
+
+class TagIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tagger', password='pass', taste_tags='Vegetarian, spicy')
+        common = dict(type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+                      longitude=76.95, price_level='average', is_approved=True)
+        self.veg = Place.objects.create(name='Veg Place', tags='veg, cozy', **common)
+        self.non_veg = Place.objects.create(name='Grill', tags='non-veg,cozy', **common)
+        self.both = Place.objects.create(name='Mixed', tags='veg,non-veg, Late  Night', **common)
+
+    def test_parse_tags(self):
+        self.assertEqual(parse_tags(' Cozy,late  night,,cozy'), ['cozy', 'late night'])
+
+    def test_tags_are_normalised(self):
+        self.assertEqual(self.both.get_tags_list(), ['veg', 'non-veg', 'late night'])
+        self.assertEqual(Tag.objects.get(name='late night').places.get(), self.both)
+        self.assertEqual(
+            sorted(self.user.taste_tag_set.values_list('name', flat=True)), ['spicy', 'vegetarian']
+        )
+
+    def test_tags_follow_edits(self):
+        self.veg.tags = 'cozy'
+        self.veg.save()
+        self.assertEqual(list(self.veg.tag_set.values_list('name', flat=True)), ['cozy'])
+        self.assertEqual(PlaceTag.objects.filter(tag__name='veg').count(), 1)
+
+    def test_exact_matching(self):
+        def ids(names, mode='all'):
+            return sorted({row['place_id'] for row in match_tags(names, mode)})
+
+        self.assertEqual(ids(['veg']), [self.veg.pk, self.both.pk])
+        self.assertEqual(ids(['veg', 'cozy']), [self.veg.pk])
+        self.assertEqual(ids(['veg', 'non-veg'], mode='any'), [self.veg.pk, self.non_veg.pk, self.both.pk])
+        self.assertEqual(ids(['veg', 'unknown']), [])
+        self.assertEqual(ids(['Veg', 'veg ']), [self.veg.pk, self.both.pk])
+
+    def test_search_view_tag_filter(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/places/search/', {'tag': 'veg, cozy'})
+        self.assertEqual([p.pk for p in response.context['results']], [self.veg.pk])
+        response = self.client.get('/places/search/', {'tag': ['veg', 'cozy'], 'tag_mode': 'any'})
+        self.assertEqual(len(response.context['results']), 3)
+
+
+class AreaAssignmentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='local', password='pass')
+        common = dict(type='food', sub_type='mess', price_level='average', is_approved=True)
+        self.rs_puram = Place.objects.create(
+            name='Kovai Idli Stall', address='RS Puram Market', latitude=11.0060, longitude=76.9565, **common
+        )
+        self.peelamedu = Place.objects.create(
+            name='Green Leaf Cafe', address='Peelamedu', latitude=11.0312, longitude=77.0165, **common
+        )
+        self.far = Place.objects.create(
+            name='Hill Stop', address='Ooty', latitude=11.41, longitude=76.70, **common
+        )
+
+    def test_registry_is_shared(self):
+        self.assertEqual(User.AREA_CHOICES, AREA_CHOICES)
+
+    def test_area_assigned_on_save(self):
+        self.assertEqual(self.rs_puram.area, 'rs_puram')
+        self.assertEqual(self.peelamedu.area, 'peelamedu')
+        self.assertEqual(self.far.area, 'other')
+        self.assertEqual(assign_area(None, None), 'other')
+
+    def test_location_filter(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/places/search/', {'location': ['rs_puram', 'singanallur']})
+        self.assertEqual([p.pk for p in response.context['results']], [self.rs_puram.pk])
+        self.assertEqual(response.context['active_filters']['location'], 'Location: RS Puram, Singanallur')
+
+    def test_backfill_writes_geohash_and_area(self):
+        # As left by rows written before the fields existed
+        Place.objects.filter(pk=self.rs_puram.pk).update(geohash='', area='')
+        PlaceTrigram.objects.filter(place=self.rs_puram).update(cell='zzzzzz')
+        version = bump_catalogue_version()
+        out = io.StringIO()
+        call_command('backfill_locations', stdout=out)
+
+        self.assertIn('Checked 3 places, updated 1.', out.getvalue())
+        self.rs_puram.refresh_from_db()
+        self.assertEqual((self.rs_puram.geohash, self.rs_puram.area), (encode_geohash(11.0060, 76.9565), 'rs_puram'))
+        self.assertEqual(find_duplicates('Kovai Idli Stall', 11.0060, 76.9565), [self.rs_puram])
+        self.assertGreater(bump_catalogue_version(), version + 1)
+
+
+class SearchPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pass')
+        self.client.force_login(self.user)
+        for i in range(30):
+            Place.objects.create(
+                name=f'Cafe {i}', type='food', sub_type='bakery', address='Coimbatore',
+                latitude=11.0, longitude=76.95, price_level='average', is_approved=True,
+                weighted_rating=[3.0, 4.5, 4.0][i % 3], tags='coffee',
+            )
+
+    def _collect(self, params):
+        seen = []
+        cursor = None
+        while True:
+            query = dict(params, limit=7)
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get('/places/search/results/', query).json()
+            self.assertLessEqual(data['count'], 7)
+            seen.append(data['count'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_pages_follow_stable_order(self):
+        expected = list(Place.objects.order_by('-weighted_rating', '-id').values_list('pk', flat=True))
+        pks = []
+        cursor = None
+        while True:
+            query = {'limit': 7}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/places/search/', query)
+            pks.extend(p.pk for p in response.context['results'])
+            page = response.context['page']
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(pks, expected)
+
+    def test_fragment_endpoint(self):
+        self.assertEqual(self._collect({}), [7, 7, 7, 7, 2])
+        self.assertEqual(sum(self._collect({'q': 'coffee'})), 30)
+
+    def test_page_size_is_capped(self):
+        self.assertEqual(get_page_size('1000'), MAX_PAGE_SIZE)
+        self.assertEqual(get_page_size('0'), 1)
+        response = self.client.get('/places/search/', {'limit': 'abc'})
+        self.assertEqual(len(response.context['results']), 24)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/places/search/results/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        # Well-formed cursors holding values of the wrong type
+        for values in (['abc', 1], [{'a': 1}, 1], [4.5, 'x'], [None, 1], [4.5, 2 ** 70]):
+            cursor = encode_cursor(values)
+            self.assertEqual(self.client.get('/places/search/', {'cursor': cursor}).status_code, 400)
+            self.assertEqual(
+                self.client.get('/places/search/results/', {'q': 'place', 'cursor': cursor}).status_code, 400
+            )
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='facets', password='pass')
+        rows = [
+            ('food', 'economical', 4.5, 11.0060, 76.9565),
+            ('food', 'premium', 3.5, 11.0060, 76.9565),
+            ('food', 'economical', 2.5, 11.0312, 77.0165),
+            ('stay', 'average', 4.2, 11.0312, 77.0165),
+            ('stay', 'economical', 3.1, 11.0060, 76.9565),
+        ]
+        for i, (kind, price, rating, lat, lon) in enumerate(rows):
+            Place.objects.create(
+                name=f'Place {i}', type=kind, sub_type='mess', address='Coimbatore', latitude=lat,
+                longitude=lon, price_level=price, weighted_rating=rating, is_approved=True,
+            )
+
+    def test_counts_in_one_query(self):
+        base = Place.objects.filter(is_approved=True)
+        with self.assertNumQueries(1):
+            facets = compute_facets(base, {'type': ['food'], 'price': [], 'location': [], 'min_rating': []})
+        # The type facet ignores its own selection, the others apply it
+        self.assertEqual(facets['type'], {'food': 3, 'stay': 2})
+        self.assertEqual(facets['price'], {'economical': 2, 'average': 0, 'premium': 1})
+        self.assertEqual(facets['min_rating'], {'4': 1, '3': 2, '2': 3})
+        self.assertEqual(facets['location']['rs_puram'], 2)
+        self.assertEqual(facets['location']['peelamedu'], 1)
+
+    def test_search_view_facets_are_cached(self):
+        self.client.force_login(self.user)
+        params = {'type': 'stay', 'price': ['average', 'economical']}
+        response = self.client.get('/places/search/', params)
+        self.assertEqual(response.context['facets']['type'], {'food': 2, 'stay': 2})
+        self.assertEqual(len(response.context['results']), 2)
+
+        Place.objects.create(
+            name='New Stay', type='stay', sub_type='pg', address='Coimbatore', latitude=11.0,
+            longitude=76.95, price_level='average', is_approved=True,
+        )
+        response = self.client.get('/places/search/', {'price': ['economical', 'average'], 'type': 'stay'})
+        self.assertEqual(response.context['facets']['type']['stay'], 3)
+
+    def test_rating_filter_is_labelled_weighted(self):
+        place = Place.objects.create(
+            name='Two Reviews', type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+            longitude=76.95, price_level='average', is_approved=True,
+        )
+        Review.objects.create(user=self.user, place=place, rating=5)
+        Review.objects.create(user=self.user, place=place, rating=4)
+        self.client.force_login(self.user)
+        response = self.client.get('/places/search/', {'min_rating': '4'})
+        # A 4.5 star average from two reviews is not a 4+ weighted rating
+        self.assertNotIn(place, response.context['results'])
+        self.assertEqual(response.context['active_filters']['min_rating'], 'Weighted rating: 4+ Stars')
+        self.assertContains(response, 'Minimum Weighted Rating')
+
+    def test_unknown_rating_thresholds_are_ignored(self):
+        self.client.force_login(self.user)
+        for value in ('abc', 'nan', '0.5'):
+            response = self.client.get('/places/search/', {'min_rating': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['results']), 5)
+            self.assertNotIn('min_rating', response.context['active_filters'])
+        response = self.client.get('/places/search/', {'min_rating': ['abc', '4']})
+        self.assertEqual(len(response.context['results']), 2)
+        self.assertEqual(compute_facets(Place.objects.all(), {'min_rating': ['nan']})['type'], {'food': 3, 'stay': 2})
+
+    def test_facets_cached_per_query(self):
+        base = Place.objects.filter(is_approved=True)
+        selected = {'type': ['food']}
+        get_facets(base, 'Cafe ', [], 'all', selected)
+        with self.assertNumQueries(0):
+            get_facets(base, 'cafe', [], 'all', selected)
+
+
+class RandomSamplingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        common = dict(sub_type='mess', address='Coimbatore', latitude=11.0, longitude=76.95,
+                      price_level='average')
+        for i in range(25):
+            Place.objects.create(name=f'Food {i}', type='food', is_approved=i % 5 != 0, **common)
+            Place.objects.create(name=f'Stay {i}', type='stay', is_approved=True, **common)
+
+    def test_sample_is_distinct_and_filtered(self):
+        with mock.patch.object(sampling, 'POOL_CHUNK_SIZE', 4):
+            places = sampling.sample_places(10, 'food')
+        self.assertEqual(len(places), 10)
+        self.assertEqual(len({p.pk for p in places}), 10)
+        self.assertTrue(all(p.type == 'food' and p.is_approved for p in places))
+        self.assertEqual(len(sampling.sample_places(100, 'food')), 20)
+
+    def test_sampling_does_not_touch_the_table_once_pooled(self):
+        sampling.sample_place_ids(10, 'food')
+        with self.assertNumQueries(0):
+            ids = sampling.sample_place_ids(10, 'food')
+        self.assertEqual(len(ids), 10)
+
+    def test_pool_refreshed_on_approval_changes(self):
+        self.assertEqual(len(sampling.sample_place_ids(100, 'food')), 20)
+        place = Place.objects.filter(type='food', is_approved=False).first()
+        place.is_approved = True
+        place.save()
+        self.assertEqual(len(sampling.sample_place_ids(100, 'food')), 21)
+        place.delete()
+        self.assertEqual(len(sampling.sample_place_ids(100, 'food')), 20)
+
+    def test_pool_kept_on_unrelated_edits(self):
+        sampling.sample_place_ids(10, 'food')
+        place = Place.objects.filter(type='food', is_approved=True).first()
+        place.description = 'Now with filter coffee.'
+        place.save()
+        with self.assertNumQueries(0):
+            sampling.sample_place_ids(10, 'food')
+
+
+class CarouselCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='home', password='pass')
+        self.client.force_login(self.user)
+        for i in range(12):
+            Place.objects.create(
+                name=f'Spot {i}', type='food', sub_type='mess', address='Coimbatore',
+                latitude=11.0 + i / 1000, longitude=76.95, price_level='average',
+                is_approved=True, average_rating=i / 3,
+            )
+
+    def test_second_hit_skips_place_queries(self):
+        self.client.get('/places/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/places/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'places_place' in q['sql']])
+
+    def test_place_changes_invalidate(self):
+        self.client.get('/places/')
+        place = Place.objects.get(name='Spot 11')
+        place.name = 'Renamed Spot'
+        place.save()
+        self.assertContains(self.client.get('/places/'), 'Renamed Spot')
+
+    def test_bulk_approval_invalidates(self):
+        hidden = Place.objects.create(
+            name='Hidden Gem', type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+            longitude=76.95, price_level='average',
+        )
+        self.assertNotContains(self.client.get('/places/'), 'Hidden Gem')
+        from .admin import PlaceAdmin
+        from django.contrib.admin.sites import site
+        PlaceAdmin(Place, site).approve_places(None, Place.objects.filter(pk=hidden.pk))
+        self.assertContains(self.client.get('/places/'), 'Hidden Gem')
+
+    def test_only_one_builder_during_rebuild(self):
+        calls = []
+        self.assertEqual(get_or_build('test:item', lambda: calls.append(1) or 'first', 60), 'first')
+        bump_catalogue_version()
+        # Simulate another worker holding the rebuild lock: the stale value is served
+        version_key = f"test:item:v{cache.get('places:catalogue_version')}"
+        cache.add(f'{version_key}:lock', 1, 30)
+        self.assertEqual(get_or_build('test:item', lambda: calls.append(1) or 'second', 60), 'first')
+        self.assertEqual(len(calls), 1)
+        cache.delete(f'{version_key}:lock')
+        self.assertEqual(get_or_build('test:item', lambda: calls.append(1) or 'second', 60), 'second')
+
+
+class TrendingScoreTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'critic{i}', password='pass') for i in range(6)]
+        common = dict(type='food', sub_type='mess', address='Coimbatore', latitude=11.0,
+                      longitude=76.95, price_level='average', is_approved=True)
+        self.old_favourite = Place.objects.create(name='Old Favourite', **common)
+        self.busy = Place.objects.create(name='Busy Place', **common)
+        self.quiet = Place.objects.create(name='Quiet Place', **common)
+
+    def _review(self, place, rating, days_ago, user=0):
+        review = Review.objects.create(place=place, user=self.users[user], rating=rating)
+        Review.objects.filter(pk=review.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def _ranking(self):
+        return list(Place.objects.order_by('-trending_score', '-id').values_list('name', flat=True))
+
+    def test_recent_activity_beats_old_ratings(self):
+        self._review(self.old_favourite, 5, days_ago=120)
+        for i in range(4):
+            self._review(self.busy, 4, days_ago=1, user=i)
+        update_trending_scores()
+        self.assertEqual(self._ranking(), ['Busy Place', 'Old Favourite', 'Quiet Place'])
+
+    def test_incremental_matches_rebuild(self):
+        self._review(self.old_favourite, 5, days_ago=10)
+        self._review(self.busy, 3, days_ago=5)
+        self.assertEqual(update_trending_scores(), 2)
+
+        self._review(self.busy, 5, days_ago=0, user=1)
+        self._review(self.quiet, 2, days_ago=0, user=2)
+        self.assertEqual(update_trending_scores(), 2)
+        self.assertEqual(update_trending_scores(), 0)
+        incremental = dict(Place.objects.values_list('pk', 'trending_score'))
+
+        update_trending_scores(rebuild=True)
+        rebuilt = dict(Place.objects.values_list('pk', 'trending_score'))
+        for pk, score in rebuilt.items():
+            self.assertAlmostEqual(incremental[pk], score)
+
+    def test_backdated_reviews_are_not_skipped(self):
+        self._review(self.busy, 4, days_ago=0)
+        self.assertEqual(update_trending_scores(), 1)
+        # Imported after the last run but dated before it
+        self._review(self.quiet, 5, days_ago=3, user=1)
+        self.assertEqual(update_trending_scores(), 1)
+        self.assertEqual(update_trending_scores(), 0)
+        incremental = dict(Place.objects.values_list('pk', 'trending_score'))
+
+        update_trending_scores(rebuild=True)
+        self.assertGreater(incremental[self.quiet.pk], 0)
+        for pk, score in Place.objects.values_list('pk', 'trending_score'):
+            self.assertAlmostEqual(incremental[pk], score)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        common = dict(address='Coimbatore', is_approved=True)
+        self.veg_cheap = Place.objects.create(
+            name='Veg Mess', type='food', sub_type='mess', price_level='economical', tags='vegetarian,thali',
+            latitude=11.0085, longitude=76.9530, weighted_rating=3.5, **common
+        )
+        self.grill = Place.objects.create(
+            name='Grill House', type='food', sub_type='mess', price_level='premium', tags='non-veg,bbq',
+            latitude=11.0312, longitude=77.0165, weighted_rating=4.8, **common
+        )
+        self.hotel = Place.objects.create(
+            name='Lake Hotel', type='stay', sub_type='hotel', price_level='premium', tags='luxury',
+            latitude=11.0085, longitude=76.9530, weighted_rating=4.0, **common
+        )
+        self.user = User.objects.create_user(
+            username='veggie', password='pass', taste_tags='Vegetarian', preferred_price='economical',
+            preferred_area='rs_puram',
+        )
+
+    def test_ranks_by_profile(self):
+        ids = rank_places(self.user, 3)
+        self.assertEqual(ids[0], self.veg_cheap.pk)
+        self.assertEqual(set(ids), {self.veg_cheap.pk, self.grill.pk, self.hotel.pk})
+
+    def test_reviewed_places_are_skipped(self):
+        Review.objects.create(user=self.user, place=self.veg_cheap, rating=5)
+        self.assertNotIn(self.veg_cheap.pk, rank_places(self.user, 3))
+
+    def test_cached_until_profile_changes(self):
+        first = recommend_place_ids(self.user, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(recommend_place_ids(self.user, 3), first)
+
+        self.user.taste_tags = 'bbq'
+        self.user.preferred_price = 'premium'
+        self.user.preferred_area = 'peelamedu'
+        self.user.save()
+        self.assertEqual(recommend_place_ids(self.user, 3)[0], self.grill.pk)
+
+    def test_cold_start_falls_back_to_sample(self):
+        newcomer = User.objects.create_user(username='newcomer', password='pass')
+        ids = rank_places(newcomer, 5)
+        self.assertEqual(set(ids), {self.veg_cheap.pk, self.grill.pk})
+
+    def test_home_page_shows_personal_carousel(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/places/')
+        self.assertContains(response, 'Veg Mess')
+
+
+class SimilarityTests(TestCase):
+    def setUp(self):
+        common = dict(address='Coimbatore', type='food', latitude=11.0, longitude=76.9, is_approved=True)
+        self.dosa = Place.objects.create(name='Dosa Corner', **common)
+        self.idli = Place.objects.create(name='Idli Shop', **common)
+        self.pizza = Place.objects.create(name='Pizza Hub', **common)
+        self.users = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(4)]
+        for user in self.users:
+            Review.objects.create(user=user, place=self.dosa, rating=5)
+            Review.objects.create(user=user, place=self.idli, rating=5)
+            Review.objects.create(user=user, place=self.pizza, rating=1)
+
+    def neighbours(self, place):
+        return list(PlaceSimilarity.objects.filter(place=place).order_by('-score').values_list('neighbor_id', flat=True))
+
+    def test_co_liked_places_are_neighbours(self):
+        self.assertGreater(build_similarities(), 0)
+        self.assertEqual(self.neighbours(self.dosa), [self.idli.pk])
+        self.assertEqual(self.neighbours(self.pizza), [])
+
+    def test_min_support_drops_sparse_pairs(self):
+        build_similarities(min_support=5)
+        self.assertFalse(PlaceSimilarity.objects.exists())
+
+    def test_rebuild_replaces_rows(self):
+        build_similarities()
+        build_similarities()
+        self.assertEqual(self.neighbours(self.dosa), [self.idli.pk])
+
+    def test_detail_page_lists_similar_places(self):
+        build_similarities()
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('places:place_detail', args=[self.dosa.pk]))
+        self.assertEqual(response.context['similar_places'], [self.idli])
+        self.assertContains(response, 'People who liked this also liked')
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        common = dict(address='Coimbatore', type='food', latitude=11.0, longitude=76.9, is_approved=True)
+        self.place = Place.objects.create(name='Dosa Corner', **common)
+        self.other = Place.objects.create(name='Idli Shop', **common)
+        self.user = User.objects.create_user(username='critic', password='pass')
+
+    def assertAggregates(self, place, count, total):
+        place.refresh_from_db()
+        self.assertEqual((place.review_count, place.rating_sum), (count, total))
+        self.assertAlmostEqual(place.average_rating, total / count if count else 0.0)
+
+    def test_create_edit_move_and_delete(self):
+        review = Review.objects.create(user=self.user, place=self.place, rating=4)
+        Review.objects.create(user=self.user, place=self.place, rating=2)
+        self.assertAggregates(self.place, 2, 6)
+
+        review.rating = 5
+        review.save()
+        self.assertAggregates(self.place, 2, 7)
+
+        review = Review.objects.get(pk=review.pk)
+        review.place = self.other
+        review.save()
+        self.assertAggregates(self.place, 1, 2)
+        self.assertAggregates(self.other, 1, 5)
+
+        review.delete()
+        self.assertAggregates(self.other, 0, 0)
+
+    def test_delete_with_deferred_fields(self):
+        review = Review.objects.create(user=self.user, place=self.place, rating=4)
+        Review.objects.create(user=self.user, place=self.place, rating=2)
+        Review.objects.only('id').get(pk=review.pk).delete()
+        self.assertFalse(Review.objects.filter(pk=review.pk).exists())
+        self.assertAggregates(self.place, 1, 2)
+
+    def test_recompute_repairs_drift(self):
+        Review.objects.create(user=self.user, place=self.place, rating=3)
+        Review.objects.bulk_create([Review(user=self.user, place=self.place, rating=5)])
+        Place.objects.filter(pk=self.other.pk).update(review_count=3, rating_sum=9, average_rating=3.0)
+
+        self.assertEqual(recompute_ratings(), 2)
+        self.assertAggregates(self.place, 2, 8)
+        self.assertAggregates(self.other, 0, 0)
+        self.assertEqual(recompute_ratings(), 0)
+
+    def test_weighted_rating_prefers_many_reviews(self):
+        Review.objects.create(user=self.user, place=self.place, rating=5)
+        for _ in range(20):
+            Review.objects.create(user=self.user, place=self.other, rating=4)
+        self.place.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertAlmostEqual(self.place.weighted_rating, weighted_rating(1, 5))
+        self.assertGreater(self.place.average_rating, self.other.average_rating)
+        self.assertGreater(self.other.weighted_rating, self.place.weighted_rating)
+
+    def test_listing_queries_are_index_ordered(self):
+        approved = Place.objects.filter(is_approved=True)
+        listings = [
+            approved.order_by('-weighted_rating', '-id'),
+            approved.filter(type='food').order_by('-weighted_rating', '-id'),
+            approved.filter(weighted_rating__gte=4).order_by('-weighted_rating', '-id'),
+            approved.filter(price_level='average').order_by('-weighted_rating', '-id'),
+            approved.order_by('-trending_score', '-id'),
+        ]
+        for queryset in listings:
+            plan = queryset[:24].explain()
+            self.assertIn('USING INDEX place_approved_', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ReviewStreamTests(TestCase):
+    def setUp(self):
+        self.place = Place.objects.create(
+            name='Busy Mess', type='food', address='Coimbatore', latitude=11.0, longitude=76.9, is_approved=True,
+        )
+        self.users = [User.objects.create_user(username=f'reviewer{i}', password='pass') for i in range(3)]
+        self.client.force_login(self.users[0])
+        now = timezone.now()
+        for i in range(25):
+            review = Review.objects.create(user=self.users[i % 3], place=self.place, rating=4, comment=f'Visit {i}')
+            # Pairs share a timestamp so the id tie-break is exercised
+            Review.objects.filter(pk=review.pk).update(created_at=now - timedelta(minutes=i // 2))
+        self.expected = list(self.place.reviews.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def test_detail_page_query_count_is_bounded(self):
+        url = reverse('places:place_detail', args=[self.place.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.content.decode().count('review-box'), 10)
+        self.assertLess(len([q for q in queries if 'reviews_review' in q['sql']]), 3)
+        self.assertContains(response, 'Older reviews')
+
+    def test_json_pages_walk_every_review(self):
+        url = reverse('places:place_reviews', args=[self.place.pk])
+        cursor = get_review_page(self.place).next_cursor
+        total = 10
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            self.assertEqual(data['html'].count('review-box'), data['count'])
+            total += data['count']
+            cursor = data['next_cursor']
+        self.assertEqual(total, 25)
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': encode_cursor(['notadate', 1])}).status_code, 400)
+
+    def test_pages_follow_index_order(self):
+        first = get_review_page(self.place, page_size=7)
+        second = get_review_page(self.place, cursor=first.next_cursor, page_size=7)
+        self.assertEqual([r.pk for r in first] + [r.pk for r in second], self.expected[:14])
+
+        plan = self.place.reviews.order_by('-created_at', '-id')[:10].explain()
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class PlaceDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.place = Place.objects.create(
+            name='Quiet Cafe', type='food', address='Coimbatore', latitude=11.0, longitude=76.9, is_approved=True,
+        )
+        self.user = User.objects.create_user(username='regular', password='pass')
+        self.client.force_login(self.user)
+        self.url = reverse('places:place_detail', args=[self.place.pk])
+
+    def version(self):
+        return Place.objects.values_list('version', flat=True).get(pk=self.place.pk)
+
+    def test_repeat_visit_gets_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.templates)
+
+        Review.objects.create(user=self.user, place=self.place, rating=5, comment='Lovely')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Lovely')
+
+    def test_new_login_gets_fresh_csrf_tokens(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Logging in again rotates the CSRF secret the cached page's forms hold
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.client.get(reverse('users:login'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_body_is_cached_per_version(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries if 'reviews_review' in q['sql']])
+
+        Place.objects.filter(pk=self.place.pk).update(description='Now with garden seating')
+        self.assertNotContains(self.client.get(self.url), 'garden seating')
+        place = Place.objects.get(pk=self.place.pk)
+        place.save()
+        self.assertContains(self.client.get(self.url), 'garden seating')
+
+    def test_changes_bump_version(self):
+        start = self.version()
+        stale = Place.objects.get(pk=self.place.pk)
+        review = Review.objects.create(user=self.user, place=self.place, rating=4)
+        review.comment = 'Edited'
+        review.save()
+        self.place.favorites.add(self.user)
+        self.user.favorite_places.clear()
+        self.assertEqual(self.version(), start + 4)
+
+        # Saving an instance loaded earlier still moves the version forward,
+        # and post_save receivers already see the new number
+        seen = []
+        def receiver(sender, instance, **kwargs):
+            seen.append(instance.version)
+        post_save.connect(receiver, sender=Place)
+        try:
+            stale.save()
+        finally:
+            post_save.disconnect(receiver, sender=Place)
+        self.assertEqual(seen, [start + 5])
+        self.assertEqual(stale.version, start + 5)
+        self.assertEqual(self.version(), start + 5)
+
+    def test_version_bumps_keep_last_modified(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.place.favorites.add(self.user)
+        build_similarities()
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['Last-Modified'], last_modified)
+
+
+class PlaceApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='mobile', password='pass')
+        self.client.force_authenticate(self.user)
+        for i in range(30):
+            Place.objects.create(
+                name=f'Mess {i}', type='food', sub_type='mess', address='Coimbatore', added_by=self.user,
+                latitude=11.0 + i / 100, longitude=76.95, weighted_rating=i / 10, is_approved=True,
+            )
+        self.favorites = list(Place.objects.order_by('-weighted_rating')[:2])
+        self.user.favorite_places.add(*self.favorites)
+
+    def test_list_query_count_is_constant(self):
+        url = reverse('places:api-place-list')
+        self.client.get(url, {'limit': 1})
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, {'limit': 5})
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'limit': 25})
+        self.assertEqual(len(small), len(large))
+
+        results = response.data['results']
+        self.assertEqual(len(results), 25)
+        self.assertEqual([r['id'] for r in results if r['is_favorited']], [p.pk for p in self.favorites])
+        self.assertNotIn('favorites', results[0])
+
+    def test_cursor_pages_cover_everything(self):
+        url = reverse('places:api-place-list')
+        seen = []
+        params = {'limit': 7}
+        while url:
+            data = self.client.get(url, params).json()
+            seen.extend(r['id'] for r in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+    def test_sparse_fieldsets(self):
+        url = reverse('places:api-place-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,name'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        self.assertFalse([q for q in queries if 'favorites' in q['sql']])
+
+    def test_nearby_and_search(self):
+        response = self.client.get(reverse('places:api-place-nearby'), {'lat': 11.0, 'lon': 76.95, 'limit': 3})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Mess 0', 'Mess 1', 'Mess 2'])
+        self.assertEqual(response.data['results'][0]['distance'], 0)
+        self.assertEqual(self.client.get(reverse('places:api-place-nearby')).status_code, 400)
+
+        response = self.client.get(reverse('places:api-place-search'), {'q': 'mess 7'})
+        self.assertEqual(response.data['results'][0]['name'], 'Mess 7')
+
+    def test_detail(self):
+        place = self.favorites[0]
+        response = self.client.get(reverse('places:api-place-detail', args=[place.pk]))
+        self.assertTrue(response.data['is_favorited'])
+
+
+class FavoriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='fan', password='pass')
+        self.client.force_login(self.user)
+        self.places = [
+            Place.objects.create(
+                name=f'Spot {i}', type='food', sub_type='mess', address='Coimbatore',
+                latitude=11.0 + i / 1000, longitude=76.95, is_approved=True,
+            )
+            for i in range(3)
+        ]
+
+    def test_toggle_endpoint(self):
+        url = reverse('places:toggle_favorite', args=[self.places[0].pk])
+        response = self.client.post(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json(), {'favorited': True})
+        self.assertTrue(self.places[0].favorites.filter(pk=self.user.pk).exists())
+
+        response = self.client.post(url, {'next': '/places/search/'})
+        self.assertRedirects(response, '/places/search/', fetch_redirect_response=False)
+        self.assertFalse(self.places[0].favorites.exists())
+
+    def test_toggle_ignores_a_stale_cached_set(self):
+        # Another worker's cache still lists a favourite removed elsewhere
+        cache.set(favorites_cache_key(self.user.pk), frozenset([self.places[0].pk]))
+        self.assertTrue(toggle_favorite(self.user, self.places[0]))
+        self.assertTrue(self.places[0].favorites.filter(pk=self.user.pk).exists())
+        self.assertFalse(toggle_favorite(self.user, self.places[0]))
+        self.assertFalse(self.places[0].favorites.exists())
+
+    def test_cached_set_follows_writes(self):
+        self.assertEqual(get_favorite_ids(self.user), frozenset())
+        with self.assertNumQueries(0):
+            get_favorite_ids(self.user)
+
+        self.user.favorite_places.add(self.places[0], self.places[1])
+        self.assertEqual(get_favorite_ids(self.user), {self.places[0].pk, self.places[1].pk})
+        self.places[1].favorites.remove(self.user)
+        self.assertEqual(get_favorite_ids(self.user), {self.places[0].pk})
+        self.places[0].favorites.clear()
+        self.assertEqual(get_favorite_ids(self.user), frozenset())
+
+    def test_pages_mark_favorites_from_the_set(self):
+        self.user.favorite_places.add(self.places[2])
+        get_favorite_ids(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/places/search/')
+        self.assertEqual(response.content.decode().count('fa-heart text-danger'), 1)
+        self.assertFalse([q for q in queries if 'favorites' in q['sql']])
+
+        # Recommended, trending and nearby carousels each show every spot
+        response = self.client.get('/places/')
+        self.assertEqual(response.content.decode().count('fa-heart text-danger'), 3)
+
+        other = User.objects.create_user(username='other', password='pass')
+        self.client.force_login(other)
+        self.assertNotContains(self.client.get('/places/'), 'fa-heart text-danger')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='ops', password='pass', is_staff=True)
+        self.old = Place.objects.create(name='Old Mess', type='food', address='Coimbatore', latitude=11.0, longitude=76.9)
+        self.new = Place.objects.create(name='New, "Fancy" Cafe', type='food', address='Coimbatore', latitude=11.0, longitude=76.9)
+        Place.objects.filter(pk=self.old.pk).update(updated_at=timezone.now() - timedelta(days=10))
+        Review.objects.create(user=self.staff, place=self.new, rating=4, comment='Line one\nline two')
+
+    def test_ndjson_since(self):
+        since = parse_since((timezone.now() - timedelta(days=1)).date().isoformat())
+        rows = [json.loads(line) for line in stream_export('places', 'ndjson', since, chunk_size=1)]
+        self.assertEqual([row['name'] for row in rows], ['New, "Fancy" Cafe'])
+        self.assertEqual(len(list(stream_export('places', 'ndjson'))), 2)
+
+    def test_admin_actions_reach_since_exports(self):
+        since = timezone.now() - timedelta(seconds=1)
+        Place.objects.filter(pk=self.new.pk).update(updated_at=timezone.now() - timedelta(days=10))
+        place_admin = admin.site._registry[Place]
+        place_admin.approve_places(None, Place.objects.filter(pk=self.old.pk))
+        place_admin.mark_reported(None, Place.objects.filter(pk=self.new.pk))
+        rows = [json.loads(line) for line in stream_export('places', 'ndjson', since)]
+        self.assertEqual(sorted(row['name'] for row in rows), ['New, "Fancy" Cafe', 'Old Mess'])
+        self.assertTrue(Place.objects.get(pk=self.old.pk).is_approved)
+
+    def test_similarity_rebuild_leaves_since_exports_empty(self):
+        Place.objects.update(updated_at=timezone.now() - timedelta(days=10))
+        version = Place.objects.get(pk=self.new.pk).version
+        since = timezone.now() - timedelta(seconds=1)
+        build_similarities()
+        self.assertEqual(list(stream_export('places', 'ndjson', since)), [])
+        # Cached detail pages are still invalidated
+        self.assertEqual(Place.objects.get(pk=self.new.pk).version, version + 1)
+
+    def test_csv_round_trips(self):
+        lines = list(stream_export('reviews', 'csv'))
+        rows = list(csv.DictReader(io.StringIO(''.join(lines))))
+        self.assertEqual(rows[0]['comment'], 'Line one\nline two')
+        self.assertEqual(rows[0]['place_id'], str(self.new.pk))
+
+    def test_endpoint_streams_for_staff_only(self):
+        url = reverse('places:export', args=['places', 'csv'])
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='guest', password='pass'))
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(list(csv.reader(io.StringIO(body)))), 3)
+        self.assertEqual(client.get(url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(client.get(reverse('places:export', args=['users', 'csv'])).status_code, 404)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_catalogue', 'reviews', stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue())['rating'], 4)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.existing = Place.objects.create(
+            name="Sri Ram's Mess", type='food', sub_type='mess', address='Gandhipuram', latitude=11.0175,
+            longitude=76.9674, price_level='economical', is_approved=True,
+        )
+
+    def rows(self, records):
+        return list(enumerate(records, 2))
+
+    def test_creates_updates_and_reports_errors(self):
+        base = dict(type='food', sub_type='mess', address='Coimbatore', price_level='average')
+        records = [
+            # ~20m from the existing place, spelled differently
+            dict(base, name='SRI RAMS  MESS', latitude=11.0176, longitude=76.9675, tags='Veg, Thali'),
+            dict(base, name='Kovai Bakery', latitude=11.02, longitude=76.96, sub_type='bakery'),
+            dict(base, name='kovai bakery', latitude=11.0201, longitude=76.96, sub_type='bakery', tags='cakes'),
+            dict(base, name='Far Away Mess', latitude=11.5, longitude=77.5),
+            dict(base, name='Broken', latitude='north', longitude=76.9),
+            dict(base, name='Bad Type', type='bar', latitude=11.0, longitude=76.9),
+        ]
+        stats = import_places(self.rows(records), batch_size=10, approve=True)
+
+        self.assertEqual((stats.created, stats.updated, stats.skipped), (2, 1, 1))
+        self.assertEqual([line for line, _ in stats.errors], [6, 7])
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'SRI RAMS  MESS')
+        self.assertEqual(self.existing.get_tags_list(), ['veg', 'thali'])
+        bakery = Place.objects.get(name='kovai bakery')
+        self.assertEqual(list(bakery.tag_set.values_list('name', flat=True)), ['cakes'])
+        self.assertTrue(bakery.is_approved)
+        self.assertTrue(bakery.geohash)
+        self.assertEqual(search_place_ids('bakery'), [bakery.pk])
+
+    def test_skip_mode_and_command(self):
+        stats = import_places(self.rows([{
+            'name': 'Sri Rams Mess', 'type': 'food', 'sub_type': 'mess', 'address': 'x',
+            'latitude': 11.0175, 'longitude': 76.9674,
+        }]), on_duplicate='skip')
+        self.assertEqual((stats.created, stats.updated, stats.skipped), (0, 0, 1))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['name', 'type', 'sub_type', 'address', 'latitude', 'longitude'])
+            writer.writerow(['Hill View PG', 'stay', 'pg', 'Peelamedu', '11.03', '77.01'])
+        out = io.StringIO()
+        call_command('import_places', handle.name, stdout=out, stderr=io.StringIO())
+        os.unlink(handle.name)
+        self.assertIn('1 created', out.getvalue())
+        self.assertFalse(Place.objects.get(name='Hill View PG').is_approved)
+
+
+class GeneratorTests(TestCase):
+    def generate(self, seed):
+        config = make_config(seed, places=40, users=15, reviews=300, chunk_size=100)
+        written = generate_dataset(config)
+        refresh_derived_data()
+        return config, written
+
+    def test_generates_consistent_data(self):
+        config, written = self.generate(seed=7)
+        self.assertEqual(written, {'users': 15, 'places': 40, 'reviews': 300})
+
+        place = Place.objects.filter(review_count__gt=0).order_by('-review_count').first()
+        self.assertEqual(place.review_count, place.reviews.count())
+        self.assertGreater(place.weighted_rating, 0)
+        self.assertTrue(place.geohash)
+        self.assertEqual(
+            place.get_tags_list(), sorted(place.tag_set.values_list('name', flat=True), key=TAG_VOCABULARY.index),
+        )
+        self.assertFalse(Review.objects.exclude(rating__range=(1, 5)).exists())
+        self.assertLess(Review.objects.order_by('created_at').first().created_at, config['now'])
+
+    def test_same_seed_same_rows(self):
+        def snapshot():
+            # Names embed ids, which continue after deleted rows
+            return (
+                list(Place.objects.order_by('pk').values_list('latitude', 'price_level', 'tags')),
+                list(Review.objects.order_by('pk').values_list('rating', 'comment')),
+            )
+
+        self.generate(seed=3)
+        first = snapshot()
+        Place.objects.all().delete()
+        get_user_model().objects.all().delete()
+        self.generate(seed=3)
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(len(first[1]), 300)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        generate_dataset(make_config(5, places=60, users=20, reviews=600, chunk_size=200))
+        refresh_derived_data()
+
+    def test_views_stay_within_query_budgets(self):
+        results = run_benchmarks(runs=1, warmup=0)
+        self.assertEqual([result.name for result in results], [scenario.name for scenario in SCENARIOS])
+        self.assertEqual(check_results(results), [])
+
+    def test_regressions_against_baseline(self):
+        result = BenchmarkResult('home', [0.050], cold_queries=3, warm_queries=2, query_budget=2)
+        baseline = {'results': {'home': {'p50_ms': 10.0, 'warm_queries': 1}}}
+        self.assertEqual(check_results([result], baseline), [
+            'home: 3 queries, budget is 2',
+            'home: 2 queries, baseline made 1',
+            'home: median 50.0ms, baseline 10.0ms',
+        ])
+        with self.assertRaises(BenchmarkError):
+            run_benchmarks(['nope'])
+
+    def test_read_only_runs_leave_the_data_alone(self):
+        reviews = Review.objects.count()
+        logins = list(User.objects.order_by('pk').values_list('last_login', flat=True))
+        cache.set('shared', 1)
+        results = run_benchmarks(runs=1, warmup=0, read_only=True)
+        self.assertNotIn('review_save', [result.name for result in results])
+        self.assertEqual(check_results(results), [])
+        self.assertEqual(Review.objects.count(), reviews)
+        self.assertEqual(list(User.objects.order_by('pk').values_list('last_login', flat=True)), logins)
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(cache.get('shared'), 1)
+        with self.assertRaises(BenchmarkError):
+            run_benchmarks(['review_save'], read_only=True)
+
+
+class SQLProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='ops', password='pass', is_staff=True)
+        self.place = Place.objects.create(
+            name='Profiled Mess', type='food', sub_type='mess', address='x', latitude=11.0, longitude=76.9,
+            price_level='average', is_approved=True,
+        )
+        profiling._recent.clear()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'a''b' AND x IN (%s, %s,  %s)"),
+            'SELECT * FROM t WHERE id = ? AND name = ? AND x IN (...)',
+        )
+
+    def test_staff_can_profile_a_request(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('places:place_detail', args=[self.place.pk]), {'profile_sql': 1})
+        self.client.get(reverse('places:place_detail', args=[self.place.pk]))
+
+        profiles = self.client.get(reverse('sql_profiles')).json()['profiles']
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['view'], 'places:place_detail')
+        self.assertEqual(profiles[0]['queries'], len(profiles[0]['statements']))
+        self.assertGreater(profiles[0]['queries'], 0)
+
+        self.client.force_login(User.objects.create_user(username='someone', password='pass'))
+        self.assertEqual(self.client.get(reverse('sql_profiles')).status_code, 403)
+
+    def test_repeated_queries_are_logged(self):
+        recorder = profiling.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                Place.objects.get(pk=self.place.pk)
+        request = RequestFactory().get('/places/')
+        profile = recorder.profile(request, HttpResponse(), 900.0, duplicate_threshold=3)
+        self.assertEqual(profile['duplicates'][0]['count'], 3)
+
+        with self.assertLogs('citymate.sql', 'WARNING') as logs:
+            profiling._log(profile, profiling.profiling_settings())
+        self.assertIn('Slow request GET /places/', logs.output[0])
+        self.assertIn('Repeated query in /places/ (3 times)', logs.output[-1])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = self.settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_requests_and_cache_lookups(self):
+        place = Place.objects.create(
+            name='Metered Mess', type='food', sub_type='mess', address='x', latitude=11.0, longitude=76.9,
+            price_level='average', is_approved=True,
+        )
+        self.client.force_login(User.objects.create_user(username='metered', password='pass'))
+        self.client.get(reverse('places:place_detail', args=[place.pk]))
+        self.client.get(reverse('places:place_detail', args=[place.pk]))
+
+        with self.settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('citymate_requests_total{method="GET",status="200",view="places:place_detail"} 2.0', body)
+        self.assertIn('citymate_request_duration_seconds_bucket{view="places:place_detail",le="+Inf"} 2.0', body)
+        self.assertIn('citymate_cache_lookups_total{cache="place_detail",result="hit"} 1.0', body)
+        self.assertIn('citymate_cache_lookups_total{cache="place_detail",result="miss"} 1.0', body)
+        self.assertIn('# TYPE citymate_db_queries_per_request histogram', body)
+
+    def test_worker_files_are_summed(self):
+        first = metrics.MetricsFile(os.path.join(self.directory, '1-1.metrics'))
+        second = metrics.MetricsFile(os.path.join(self.directory, '2-1.metrics'))
+        for i in range(5000):
+            first.increment(f'citymate_otp_sent_total{{channel="sms",outcome="sent{i}"}}')
+        second.increment('citymate_otp_sent_total{channel="sms",outcome="sent7"}', 2)
+        self.assertGreater(os.path.getsize(first.path), metrics.INITIAL_SIZE)
+
+        totals = metrics.collect()
+        self.assertEqual(totals['citymate_otp_sent_total{channel="sms",outcome="sent7"}'], 3.0)
+        self.assertEqual(len(totals), 5000)
+        # Reopening a file picks up its slots
+        reopened = metrics.MetricsFile(first.path)
+        reopened.increment('citymate_otp_sent_total{channel="sms",outcome="sent0"}')
+        self.assertEqual(metrics.read_file(first.path)['citymate_otp_sent_total{channel="sms",outcome="sent0"}'], 2.0)
+
+    def test_scrapes_are_restricted(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username='member', password='pass'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user(username='ops', password='pass', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_exited_workers_are_merged(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        exited = metrics.MetricsFile(os.path.join(self.directory, f'{process.pid}-1.metrics'))
+        exited.increment('citymate_otp_sent_total{channel="sms",outcome="sent"}', 2)
+        exited.close()
+        metrics.OTP_SENT.inc(channel='sms', outcome='sent')
+
+        self.assertEqual(metrics.merge_exited_workers(), 1)
+        self.assertEqual(metrics.merge_exited_workers(), 0)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted([metrics.ARCHIVE_FILE, metrics.MERGE_LOCK_FILE, os.path.basename(metrics._writer().path)]),
+        )
+        self.assertEqual(metrics.collect()['citymate_otp_sent_total{channel="sms",outcome="sent"}'], 3.0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.REQUEST_LATENCY
+        for value in (0.001, 0.2, 30):
+            histogram.observe(value, view='x')
+        body = metrics.render(metrics.collect())
+        self.assertIn('citymate_request_duration_seconds_bucket{view="x",le="0.005"} 1.0', body)
+        self.assertIn('citymate_request_duration_seconds_bucket{view="x",le="0.25"} 2.0', body)
+        self.assertIn('citymate_request_duration_seconds_bucket{view="x",le="+Inf"} 3.0', body)
+        self.assertIn('citymate_request_duration_seconds_count{view="x"} 3.0', body)
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='adder', password='pass')
+        self.place = Place.objects.create(
+            name="Sri Ram's Mess", type='food', sub_type='mess', address='Gandhipuram', latitude=11.0175,
+            longitude=76.9674, price_level='economical', is_approved=True,
+        )
+
+    def test_finds_similar_names_nearby(self):
+        with self.assertNumQueries(2):
+            matches = find_duplicates('SRI RAMS  MESS', 11.0179, 76.9677)
+        self.assertEqual(matches, [self.place])
+        self.assertEqual(matches[0].similarity, 1.0)
+        self.assertLess(matches[0].distance, 0.1)
+
+        self.assertEqual(find_duplicates('Sri Rama Mess', 11.0179, 76.9677), [self.place])
+        self.assertEqual(find_duplicates('Kovai Bakery', 11.0179, 76.9677), [])
+        self.assertEqual(find_duplicates("Sri Ram's Mess", 11.04, 76.9674), [])
+        self.assertEqual(find_duplicates("Sri Ram's Mess", 11.0175, 76.9674, exclude=self.place.pk), [])
+
+    def test_index_follows_renames_and_deletes(self):
+        self.place.name = 'Annapoorna Hotel'
+        self.place.save()
+        self.assertEqual(find_duplicates("Sri Ram's Mess", 11.0175, 76.9674), [])
+        self.assertEqual(find_duplicates('Annapoorna Hotel', 11.0175, 76.9674), [self.place])
+
+        count = PlaceTrigram.objects.count()
+        self.assertEqual(rebuild_trigram_index(), 1)
+        self.assertEqual(PlaceTrigram.objects.count(), count)
+        self.assertEqual(find_duplicates('Annapoorna Hotel', 11.0175, 76.9674), [self.place])
+        self.place.delete()
+        self.assertFalse(PlaceTrigram.objects.exists())
+
+    def test_add_place_asks_before_saving_a_duplicate(self):
+        self.client.force_login(self.user)
+        data = {
+            'name': 'Sri Rams Mess', 'type': 'food', 'sub_type': 'mess', 'address': 'Gandhipuram',
+            'latitude': 11.0176, 'longitude': 76.9675, 'price_level': 'economical',
+        }
+        response = self.client.post(reverse('places:add_place'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('places:place_detail', args=[self.place.pk]))
+        self.assertEqual(Place.objects.count(), 1)
+
+        response = self.client.post(reverse('places:add_place'), dict(data, confirm_new='1'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Place.objects.count(), 2)
@@ -0,0 +1,76 @@
+"""Time-decayed trending scores for places.
+
+Every review adds ``rating / 5`` to its place, decayed with a configurable
+half-life. Each contribution is scaled by ``exp(decay * (created - EPOCH))``
+rather than decayed towards "now". Every score then shares the same
+``exp(-decay * (now - EPOCH))`` factor, so places can be ranked without
+touching the ones that received no new reviews. Only places with new
+reviews need an update. Scores are stored as ``log(1 + sum)`` to stay in
+float range, which keeps the order and lets updates use ``logaddexp``.
+
+Progress is kept as the id of the last review folded in, so reviews that
+are backdated, imported or share a timestamp are still picked up.
+"""
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .bulk import update_places
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def decay_rate():
+    """Decay per day for the configured half-life."""
+    return math.log(2) / getattr(settings, 'TRENDING_HALF_LIFE_DAYS', 7)
+
+
+def review_log_weight(rating, created_at, rate=None):
+    if rating <= 0:
+        return -math.inf
+    rate = decay_rate() if rate is None else rate
+    days = (created_at - EPOCH).total_seconds() / 86400
+    return math.log(rating / 5) + rate * days
+
+
+def update_trending_scores(rebuild=False, batch_size=2000):
+    """Fold reviews created since the last run into trending scores.
+
+    With ``rebuild`` every score is recomputed from scratch, which also
+    accounts for edited and deleted reviews. Returns the number of places
+    updated.
+    """
+    from reviews.models import Review
+    from .models import Place, TrendingProgress
+
+    with transaction.atomic():
+        progress, _ = TrendingProgress.objects.select_for_update().get_or_create(pk=1)
+        if rebuild:
+            Place.objects.update(trending_score=0.0, trending_updated_at=None)
+            progress.last_review_id = 0
+
+        reviews = Review.objects.filter(pk__gt=progress.last_review_id).order_by('pk')
+        rate = decay_rate()
+        added = {}
+        last_review_id = progress.last_review_id
+        rows = reviews.values_list('pk', 'place_id', 'rating', 'created_at').iterator(chunk_size=batch_size)
+        for last_review_id, place_id, rating, created_at in rows:
+            added[place_id] = np.logaddexp(added.get(place_id, -math.inf), review_log_weight(rating, created_at, rate))
+
+        progress.last_review_id = last_review_id
+        progress.save()
+        if not added:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        place_ids = sorted(added)
+        for start in range(0, len(place_ids), batch_size):
+            batch = Place.objects.only('id', 'trending_score').in_bulk(place_ids[start:start + batch_size])
+            for place in batch.values():
+                place.trending_score = float(np.logaddexp(place.trending_score, added[place.pk]))
+                place.trending_updated_at = now
+            update_places(batch.values(), ['trending_score', 'trending_updated_at'], bump_version=False)
+    return len(place_ids)
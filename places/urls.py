@@ -1,12 +1,22 @@
-from django.urls import path
-from .views import HomeView, SearchView, AddPlaceView, AddReviewView, PlaceDetailView
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+from .api import ExportView, PlaceViewSet
+from .views import HomeView, SearchView, SearchResultsView, AddPlaceView, AddReviewView, PlaceDetailView, PlaceReviewsView, FavoriteToggleView
 
 app_name = "places"
 
+router = SimpleRouter()
+router.register('api', PlaceViewSet, basename='api-place')
+
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('search/', SearchView.as_view(), name='search'),
+    path('search/results/', SearchResultsView.as_view(), name='search_results'),
     path('add-place/', AddPlaceView.as_view(), name='add_place'),
     path('add-review/', AddReviewView.as_view(), name='add_review'),
     path('<int:pk>/', PlaceDetailView.as_view(), name='place_detail'),
+    path('<int:pk>/reviews/', PlaceReviewsView.as_view(), name='place_reviews'),
+    path('<int:pk>/favorite/', FavoriteToggleView.as_view(), name='toggle_favorite'),
+    path('export/<str:kind>.<str:fmt>', ExportView.as_view(), name='export'),
+    path('', include(router.urls)),
 ]
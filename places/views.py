@@ -1,34 +1,76 @@
+import hashlib
+
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag, url_has_allowed_host_and_scheme
+from django.utils.safestring import mark_safe
 from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.conf import settings
+from citymate.metrics import record_cache_lookup
 from .models import Place
 from .forms import AddPlaceForm
+from .areas import AREA_CHOICES, OTHER_AREA, area_centroid, area_label
+from .facets import RATING_THRESHOLDS, facet_q, get_facets
+from .favorites import toggle_favorite
+from .carousels import home_carousels
+from .duplicates import find_duplicates
+from .geo import annotate_distances
+from .pagination import InvalidCursor, get_page_size, paginate_keyset
+from .search import search_places
+from .tags import filter_by_tags, parse_tags
 from reviews.forms import AddReviewForm, ReviewFormForDetailPage
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
 from django.contrib import messages
 
 
+def get_user_location(request):
+    """Resolve the point to rank nearby places from.
+
+    Coordinates passed as ``?lat=&lon=`` (e.g. from browser geolocation) are
+    remembered in the session; otherwise the centre of the user's preferred
+    area, or of the city, is used.
+    """
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            request.session['user_location'] = [lat, lon]
+            return lat, lon
+    except (KeyError, ValueError):
+        pass
+
+    if 'user_location' in request.session:
+        return tuple(request.session['user_location'])
+    centroid = area_centroid(getattr(request.user, 'preferred_area', None))
+    if centroid:
+        return centroid
+    return tuple(settings.CITYMATE_DEFAULT_LOCATION)
+
+
 class HomeView(LoginRequiredMixin, View):
     def get(self, request):
-        trending_places = Place.objects.filter(is_approved=True).order_by('-average_rating')[:10]
-        nearby_places = Place.objects.filter(is_approved=True).order_by('?')[:10]
-        recommendations = Place.objects.filter(is_approved=True, type='food').order_by('?')[:10]
-
+        lat, lon = get_user_location(request)
         context = {
-            'trending_places': trending_places,
-            'nearby_places': nearby_places,
-            'recommendations': recommendations,
+            'carousels': home_carousels(lat, lon, request.user),
         }
         return render(request, 'places/home.html', context)
 
 
 class SearchView(LoginRequiredMixin, View):
-    def get(self, request):
+    def get_results(self, request):
+        """Apply the request's filters; returns (results, ordering, context)."""
         query = request.GET.get('q', '')
         locations = request.GET.getlist('location')
-        min_ratings = request.GET.getlist('min_rating')
+        min_ratings = [value for value in request.GET.getlist('min_rating') if value in RATING_THRESHOLDS]
         prices = request.GET.getlist('price')
         types = request.GET.getlist('type')
+        tags = parse_tags(','.join(request.GET.getlist('tag')))
+        tag_mode = 'any' if request.GET.get('tag_mode') == 'any' else 'all'
 
         results = Place.objects.filter(is_approved=True)
         active_filters = {}
@@ -39,58 +81,108 @@ class SearchView(LoginRequiredMixin, View):
             'premium': 'Costly'
         }
         
-        location_map = {
-            'peelamedu': 'Peelamedu',
-            'ram_nagar': 'Ram Nagar',
-            'saibaba_colony': 'Saibaba Colony',
-            'singanallur': 'Singanallur',
-            'gandhipuram': 'Gandhipuram',
-            'hopes': 'Hope College',
-        }
-
         if query:
-            results = results.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query) | 
-                Q(tags__icontains=query)
-            )
+            results = search_places(results, query)
             active_filters['q'] = f'Search: "{query}"'
-        
-        if locations:
-            location_query = Q()
-            for loc in locations:
-                location_query |= Q(address__icontains=location_map.get(loc, loc))
-            results = results.filter(location_query)
 
-            loc_tags = [location_map.get(loc, loc) for loc in locations]
+        if tags:
+            results = filter_by_tags(results, tags, tag_mode)
+
+        # Facet counts are taken before the sidebar filters narrow the results
+        selected = {'location': locations, 'min_rating': min_ratings, 'price': prices, 'type': types}
+        facets = get_facets(results, query, tags, tag_mode, selected)
+        for name, values in selected.items():
+            if values:
+                results = results.filter(facet_q(name, values))
+
+        if locations:
+            loc_tags = [area_label(loc) for loc in locations]
             active_filters['location'] = f"Location: {', '.join(loc_tags)}"
 
         if min_ratings:
             lowest_rating = min(float(r) for r in min_ratings)
-            results = results.filter(average_rating__gte=lowest_rating)
-            active_filters['min_rating'] = f'{int(lowest_rating)}+ Stars'
+            active_filters['min_rating'] = f'Weighted rating: {int(lowest_rating)}+ Stars'
 
         if prices:
-            results = results.filter(price_level__in=prices)
             price_tags = [price_map.get(p, p) for p in prices]
             active_filters['price'] = f"Budget: {', '.join(price_tags)}"
             
         if types:
-            results = results.filter(type__in=types)
             active_filters['type'] = f"Type: {', '.join(types).title()}"
 
+        if tags:
+            joiner = ' or ' if tag_mode == 'any' else ' and '
+            active_filters['tag'] = f"Tags: {joiner.join(tags)}"
+
+        # The trailing id keeps the order stable for keyset pagination, and
+        # descending matches a backward scan of the weighted_rating indexes.
+        # Substring matching, used when there is no search index, has no rank.
+        if 'search_rank' in results.query.annotations:
+            ordering = ('search_rank', 'id')
+        else:
+            ordering = ('-weighted_rating', '-id')
+
         context = {
-            'results': results,
             'active_filters': active_filters,
             'q': query,
             'locations': locations,
+            'area_choices': [
+                (value, label, facets['location'][value])
+                for value, label in AREA_CHOICES if value != OTHER_AREA
+            ],
+            'facets': facets,
             'min_ratings': min_ratings,
             'prices': prices,
             'types': types,
+            'tags': tags,
+            'tag_mode': tag_mode,
         }
+        return results, ordering, context
+
+    def get_page(self, request, results, ordering):
+        page = paginate_keyset(
+            results, ordering,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request.GET.get('limit')),
+        )
+        lat, lon = get_user_location(request)
+        annotate_distances(page.items, lat, lon)
+        return page
+
+    def get(self, request):
+        results, ordering, context = self.get_results(request)
+        try:
+            page = self.get_page(request, results, ordering)
+        except InvalidCursor:
+            return HttpResponseBadRequest('Invalid cursor.')
+
+        next_params = request.GET.copy()
+        next_params['cursor'] = page.next_cursor or ''
+        context.update({
+            'results': page.items,
+            'page': page,
+            'next_query': next_params.urlencode(),
+        })
         return render(request, 'places/search.html', context)
 
 
+class SearchResultsView(SearchView):
+    """JSON fragments of search results for infinite scrolling."""
+    def get(self, request):
+        results, ordering, _ = self.get_results(request)
+        try:
+            page = self.get_page(request, results, ordering)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+        html = render_to_string('places/search_results.html', {'results': page.items}, request=request)
+        return JsonResponse({
+            'html': html,
+            'count': len(page),
+            'next_cursor': page.next_cursor,
+        })
+
+
 class AddPlaceView(LoginRequiredMixin, View):
     def get(self, request):
         form = AddPlaceForm()
@@ -101,6 +193,12 @@ class AddPlaceView(LoginRequiredMixin, View):
         if form.is_valid():
             place = form.save(commit=False)
 
+            # Ask before adding what looks like a place we already have
+            if not request.POST.get('confirm_new'):
+                duplicates = find_duplicates(place.name, place.latitude, place.longitude)
+                if duplicates:
+                    return render(request, 'places/add_place.html', {'form': form, 'duplicates': duplicates})
+
             if 'photo' in request.FILES:
                 place.photo = request.FILES['photo']
 
@@ -129,15 +227,84 @@ class AddReviewView(LoginRequiredMixin, View):
         return render(request, 'places/add_review.html', {'form': form})
 
 
+REVIEW_PAGE_SIZE = 10
+
+
+def get_review_page(place, cursor=None, page_size=REVIEW_PAGE_SIZE):
+    """Newest-first page of a place's reviews, walked along the (place, created_at) index."""
+    reviews = place.reviews.select_related('user')
+    return paginate_keyset(reviews, ('-created_at', '-id'), cursor=cursor, page_size=page_size)
+
+
+PLACE_DETAIL_TIMEOUT = 60 * 60
+
+
+def get_detail_place(request, pk):
+    """The place being viewed, fetched once per request."""
+    if getattr(request, '_detail_place', None) is None:
+        request._detail_place = Place.objects.filter(pk=pk).first()
+    return request._detail_place
+
+
+def place_detail_etag(request, pk):
+    place = get_detail_place(request, pk)
+    if place is None:
+        return None
+    # The page also shows the user's name and forms holding their CSRF token,
+    # whose secret changes on every login, so both are part of the tag
+    csrf = hashlib.md5(request.META.get('CSRF_COOKIE', '').encode()).hexdigest()[:8]
+    return f'{place.pk}-{place.version}-{request.user.pk}-{csrf}'
+
+
+def place_detail_last_modified(request, pk):
+    place = get_detail_place(request, pk)
+    return place.updated_at if place is not None else None
+
+
+def render_place_detail_parts(request, place):
+    """Rendered summary and first review page, cached per place version."""
+    key = f'place_detail:{place.pk}:v{place.version}'
+    parts = cache.get(key)
+    record_cache_lookup('place_detail', parts is not None)
+    if parts is None:
+        context = {'place': place, 'review_page': get_review_page(place)}
+        parts = {
+            'summary': render_to_string('places/place_summary.html', context, request=request),
+            'reviews': render_to_string('places/place_reviews.html', context, request=request),
+        }
+        cache.set(key, parts, PLACE_DETAIL_TIMEOUT)
+    return {name: mark_safe(html) for name, html in parts.items()}
+
+
 class PlaceDetailView(LoginRequiredMixin, View):
-    def get(self, request, pk):
-        place = get_object_or_404(Place, pk=pk)
-        review_form = ReviewFormForDetailPage()
+    similar_count = 6
+
+    def get_similar_places(self, place):
+        links = (
+            place.similar_links.filter(neighbor__is_approved=True)
+            .select_related('neighbor').order_by('-score')[:self.similar_count]
+        )
+        return [link.neighbor for link in links]
+
+    def render_page(self, request, place, review_form):
         return render(request, 'places/place_detail.html', {
             'place': place,
-            'review_form': review_form
+            'review_form': review_form,
+            'detail': render_place_detail_parts(request, place),
+            'similar_places': self.get_similar_places(place),
         })
 
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=place_detail_etag, last_modified_func=place_detail_last_modified))
+    def get(self, request, pk):
+        place = get_detail_place(request, pk)
+        if place is None:
+            raise Http404('No Place matches the given query.')
+        response = self.render_page(request, place, ReviewFormForDetailPage())
+        # Rendering may have issued a new CSRF secret; tag the page with it
+        response.headers['ETag'] = quote_etag(place_detail_etag(request, pk))
+        return response
+
     def post(self, request, pk):
         place = get_object_or_404(Place, pk=pk)
         review_form = ReviewFormForDetailPage(request.POST)
@@ -150,7 +317,37 @@ class PlaceDetailView(LoginRequiredMixin, View):
             messages.success(request, 'Thank you! Your review has been added.')
             return redirect('places:place_detail', pk=pk)  
 
-        return render(request, 'places/place_detail.html', {
-            'place': place,
-            'review_form': review_form
-        })
\ No newline at end of file
+        return self.render_page(request, place, review_form)
+
+
+class PlaceReviewsView(LoginRequiredMixin, View):
+    """JSON pages of older reviews for the place detail page."""
+    def get(self, request, pk):
+        place = get_object_or_404(Place, pk=pk)
+        try:
+            page = get_review_page(
+                place, cursor=request.GET.get('cursor'),
+                page_size=get_page_size(request.GET.get('limit'), default=REVIEW_PAGE_SIZE),
+            )
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+        html = render_to_string('places/review_list.html', {'reviews': page.items}, request=request)
+        return JsonResponse({
+            'html': html,
+            'count': len(page),
+            'next_cursor': page.next_cursor,
+        })
+
+
+class FavoriteToggleView(LoginRequiredMixin, View):
+    """Add or remove a place from the user's favourites."""
+    def post(self, request, pk):
+        place = get_object_or_404(Place, pk=pk, is_approved=True)
+        favorited = toggle_favorite(request.user, place)
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'favorited': favorited})
+        next_url = request.POST.get('next')
+        if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+            return redirect(next_url)
+        return redirect('places:place_detail', pk=pk)
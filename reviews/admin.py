@@ -5,4 +5,5 @@ from .models import Review
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('place', 'user', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
-    search_fields = ('place__name', 'user__username', 'comment')
\ No newline at end of file
+    search_fields = ('place__name', 'user__username', 'comment')
+    list_select_related = ('place', 'user')
\ No newline at end of file
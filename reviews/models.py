@@ -17,5 +17,30 @@ class Review(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Newest-first review pages for one place, read backwards
+            models.Index(fields=['place', 'created_at']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_rating()
+        return instance
+
+    def remember_rating(self):
+        # What the database holds, so rating aggregates can apply exact deltas
+        self._loaded_rating = (self.__dict__.get('place_id'), self.__dict__.get('rating'))
+
+    def loaded_rating(self):
+        """``(place_id, rating)`` as last loaded from or saved to the database."""
+        loaded = getattr(self, '_loaded_rating', None)
+        if loaded is None or None in loaded:
+            # Deferred fields; fetch the stored values
+            loaded = type(self).objects.filter(pk=self.pk).values_list('place_id', 'rating').first()
+        return loaded or (self.place_id, self.rating)
+
     def __str__(self):
         return f"{self.user.username} review on {self.place.name}"
\ No newline at end of file
@@ -6,20 +6,14 @@ from django.utils import timezone
 import random
 import string
 
+from places.areas import AREA_CHOICES
+
 class User(AbstractUser):
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
     phone_number = models.CharField(max_length=15, unique=True, blank=True, null=True)
     age = models.PositiveIntegerField(blank=True, null=True)
     preferred_city = models.CharField(max_length=100, blank=True, default="Coimbatore")
-    AREA_CHOICES = [
-        ('rs_puram', 'RS Puram'),
-        ('gandhipuram', 'Gandhipuram'),
-        ('peelamedu', 'Peelamedu'),
-        ('hopes', 'Hope College'),
-        ('saibaba_colony', 'Saibaba Colony'),
-        ('singanallur', 'Singanallur'),
-        ('other', 'Other/Not Listed'),
-    ]
+    AREA_CHOICES = AREA_CHOICES
     preferred_area = models.CharField(
         max_length=100,
         choices=AREA_CHOICES,
@@ -1,18 +1,25 @@
 from django.conf import settings
 from django.core.mail import send_mail
 from twilio.rest import Client
+
+from citymate.metrics import OTP_SENT
 from .models import OTP
 
 
 def send_otp_email(otp: OTP):
     """Send OTP to email."""
-    send_mail(
-        subject='Your CityMate Verification Code',
-        message=f'Your OTP for CityMate is: {otp.code}',
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[otp.contact_info],
-        fail_silently=False,
-    )
+    try:
+        send_mail(
+            subject='Your CityMate Verification Code',
+            message=f'Your OTP for CityMate is: {otp.code}',
+            from_email=settings.EMAIL_HOST_USER,
+            recipient_list=[otp.contact_info],
+            fail_silently=False,
+        )
+    except Exception:
+        OTP_SENT.inc(channel='email', outcome='failed')
+        raise
+    OTP_SENT.inc(channel='email', outcome='sent')
     return otp
 
 
@@ -24,6 +31,7 @@ def send_otp_phone(otp: OTP):
         getattr(settings, 'TWILIO_PHONE_NUMBER', None)
     ]):
         print("Twilio is not configured. Skipping SMS.")
+        OTP_SENT.inc(channel='sms', outcome='skipped')
         return None
 
     client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
@@ -41,7 +49,9 @@ def send_otp_phone(otp: OTP):
             from_=settings.TWILIO_PHONE_NUMBER,
             to=phone_number
         )
+        OTP_SENT.inc(channel='sms', outcome='sent')
         return otp
     except Exception as e:
         print(f"Error sending SMS: {e}")
+        OTP_SENT.inc(channel='sms', outcome='failed')
         return None
@@ -216,7 +216,7 @@ class SetPasswordView(View):
 class ProfileView(LoginRequiredMixin, View):
     
     def get(self, request):
-        user_reviews = Review.objects.filter(user=request.user).order_by('-created_at')
+        user_reviews = Review.objects.filter(user=request.user).select_related('place').order_by('-created_at')
         added_places = Place.objects.filter(added_by=request.user).order_by('-name')
         form = ProfileUpdateForm(instance=request.user)
         
@@ -234,7 +234,7 @@ class ProfileView(LoginRequiredMixin, View):
             messages.success(request, "Profile updated successfully!")
             return redirect('users:profile')
         
-        user_reviews = Review.objects.filter(user=request.user).order_by('-created_at')
+        user_reviews = Review.objects.filter(user=request.user).select_related('place').order_by('-created_at')
         added_places = Place.objects.filter(added_by=request.user).order_by('-name')
         return render(request, 'users/profile.html', {
             'user_reviews': user_reviews,